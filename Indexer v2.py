@@ -7,6 +7,8 @@
 #
 # REQUIREMENTS:     [1a] [ARCH-BASED] Tesseract - 'tesseract'
 #                   [1b] [DEBIAN-BASED] Tesseract - 'tesseract-ocr'
+#                   [1c] In-process Tesseract engine - 'pip3 install -r requirements-ocr.txt'
+#                        ([DEBIAN-BASED] needs 'libtesseract-dev', 'libleptonica-dev', 'pkg-config')
 #                   [2a] [ARCH-BASED] LaTeX - 'texlive-basic', 'texlive-binextra'
 #                   [2b] [DEBIAN-BASED] LaTeX - 'makeindex', 'pdflatex'
 #
@@ -27,16 +29,34 @@ import sys
 import csv
 import argparse
 import re
+import math
+import queue
+import threading
 from datetime import datetime
 import subprocess
-from time import sleep
+from time import sleep, perf_counter
+from collections import deque, Counter
+from itertools import chain, groupby
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 import fitz
 import nltk
-from textblob import TextBlob
 import numpy as np
 import cv2
-from pytesseract import image_to_string
 from tqdm import tqdm
+from ocr_backends import make_ocr_backend
+from nlp_engines import make_nlp_engine
+from boilerplate import Boilerplate
+from term_store import TermStore, write_term_store
+from fulltext import write_page_store, write_fulltext_index
+from inverted_index import InvertedIndex
+from index_segments import read_segment, write_segment
+from makeindex import make_ind, compare_with_makeindex
+from index_pdf import render_index
+from build_manifest import BuildManifest, fingerprint
+from title_cache import TitleCache
+from journal import BookJournal
+from profiling import StageTimer, ProfileReport, merge_profile_dumps, STAGES
 
 # Function to unlock PDFs
 def unlock_pdf(password, source_file):
@@ -50,6 +70,51 @@ def unlock_pdf(password, source_file):
         print(f"[ERROR] An error occured while unlocking the PDF: {e}")
         return False, None
 
+# Wrap the samples of a grayscale pixmap as a NumPy array without copying.
+# The array does not keep the pixmap alive, so callers must hold a reference to it.
+def pixmap_to_array(pixmap):
+    img = np.frombuffer(pixmap.samples_mv, dtype=np.uint8)
+    return img.reshape(pixmap.height, pixmap.stride)[:, :pixmap.width]
+
+# SANS copyright and license footer, and the page number line above it
+FOOTER_PATTERN = re.compile(r'\s*[\n0-9]*\n© [0-9]{4} [\w\s0-9\n]+© SANS Institute [0-9]{4}\n[a-f0-9]+\n.+@.+\n[0-9]+\n\w+ \w+\n.+\nlive\nLicensed To: \w+ \w+ <.+@.+> \w+ [0-9]+, [0-9]{4}\nLicensed To: \w+ \w+ <.+@.+> \w+ [0-9]+, [0-9]{4}\n')
+PAGE_NUMBER_PATTERN = re.compile(r'\n\d+\n©\s')
+# Longest term printed in the index
+MAX_TERM_LENGTH = 30
+# makeindex escaping of index terms
+IDX_ESCAPES = str.maketrans({'_': '\\_', '"': '\\"'})
+# Runs of at least this many consecutive pages become a page range, as makeindex would form
+RANGE_MIN_PAGES = 3
+# Entries written to the .idx file at a time
+IDX_CHUNK_LINES = 4096
+# Characters allowed in an index term
+TERM_PATTERN = re.compile(r'[0-9a-zA-Z\-_\|\[\]\+\.\(\),\'"~ ]+')
+# IPv4 addresses and similar dotted numbers
+IP_PATTERN = re.compile(r'\d+\.\d+\.\d+\.\d+')
+# Leading or trailing single quote
+QUOTE_PATTERN = re.compile(r'^\'|\'$')
+
+# Tolerance in pixels of the coarse title bar search, on its box limits and around the bar
+COARSE_SLACK = 2
+
+# Luminance (0-1) of a vector fill color given as gray or RGB components
+def fill_luminance(fill):
+    if len(fill) == 3:
+        return 0.299 * fill[0] + 0.587 * fill[1] + 0.114 * fill[2]
+    return sum(fill) / len(fill)
+
+# [start, end) runs of True values of a 1-D mask, joining runs separated by at most gap
+# False values
+def true_runs(mask, gap=0):
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    if not len(starts):
+        return []
+    keep = starts[1:] - ends[:-1] > gap
+    starts = starts[np.concatenate(([True], keep))]
+    ends = ends[np.concatenate((keep, [True]))]
+    return list(zip(starts.tolist(), ends.tolist()))
+
 # Class to convert PDF to CSV
 class PDFProcessor:
     course_pattern = r'[A-Z]{3}[0-9]{3} \| [a-zA-Z, ]+\n'
@@ -59,28 +124,168 @@ class PDFProcessor:
     title_sep = [382, 500, 1661, 1668]
 
     # Initialize class with specified OCR DPI and bounding box
-    def __init__(self, top_bounds, ocr_dpi, stopwords):
+    # render_mode 'clip' rasterizes only the top_bounds region in grayscale,
+    # 'page' renders the whole page through the legacy JPEG round-trip
+    # title_cache is the path of the persistent OCR title cache (None disables it)
+    # title_strategy 'auto' reads titles from the text layer inside a vector title bar and
+    # only falls back to raster+OCR when there is none, 'ocr' always uses raster+OCR
+    # profile records per-stage timings of every page (see profiling.py)
+    # nlp_engine selects the term extraction engine (see nlp_engines.py)
+    # strip_mode 'learned' removes lines repeated across the book's pages (see boilerplate.py),
+    # 'regex' removes the SANS license footer with a fixed pattern
+    # coarse_dpi looks for the title bar on a low-resolution render first (clip mode), so only
+    # the bar is rendered at ocr_dpi and pages without a bar skip the full render; 0 disables it
+    # box_detector 'contour' finds the title bar with OpenCV contours, 'projection' with the
+    # row and column sums of the dark pixels
+    def __init__(self, top_bounds, ocr_dpi, stopwords, render_mode='clip', ocr_backend='auto', title_cache=None, title_cache_size=50000,
+                 title_strategy='auto', profile=False, profile_stage=None, profile_dump=None, nlp_engine='textblob',
+                 strip_mode='learned', coarse_dpi=60, box_detector='contour'):
         self.top_bounds = top_bounds
         self.ocr_dpi = ocr_dpi
+        self.coarse_dpi = coarse_dpi
+        self.box_detector = box_detector
         self.stopwords = stopwords
+        self.stopword_set = frozenset(stopwords)
+        self.nlp_engine = nlp_engine
+        self.strip_mode = strip_mode
+        self.nlp = None
+        self.render_mode = render_mode
+        self.ocr_backend = ocr_backend
+        self.title_cache = title_cache
+        self.title_cache_size = title_cache_size
+        self.title_strategy = title_strategy
+        # OCR engines and title cache connections are per thread (see read_book_pipelined)
+        self.local = threading.local()
+        self.title_sources = Counter()
+        self.timer = StageTimer(profile, profile_stage, profile_dump)
+
+    # OCR engine of this thread, created on first use and kept for all later pages
+    def get_ocr(self):
+        if getattr(self.local, 'ocr', None) is None:
+            self.local.ocr = make_ocr_backend(self.ocr_backend, lang='eng')
+        return self.local.ocr
+
+    # Term extraction engine of this process, created on first use
+    def get_nlp(self):
+        if self.nlp is None:
+            self.nlp = make_nlp_engine(self.nlp_engine)
+        return self.nlp
+
+    # Title cache connection of this thread, opened on first use
+    def get_cache(self):
+        if getattr(self.local, 'cache', None) is None and self.title_cache:
+            self.local.cache = TitleCache(self.title_cache, self.title_cache_size)
+        return getattr(self.local, 'cache', None)
 
     # Extract title of a page using OCR
     def get_page_title(self, page):
-        img = self.get_page_image(page)
-        boxes = self.get_image_boxes(img[
-            self.top_bounds[0]:self.top_bounds[1],
-            self.top_bounds[2]:self.top_bounds[3]
-        ])
-        boxes = [count for count in boxes if count[0] < 200 and count[2] > 500 and count[3] > 50]
-        if not len(boxes):
+        return self.detect_title(page)[0]
+
+    # Extract title of a page and report where it came from ('vector', 'ocr', 'cache' or 'none')
+    def detect_title(self, page):
+        title, title_source, img = self.find_title(page)
+        if img is None:
+            return title, title_source
+        return self.read_title_image(img)
+
+    # Title of a page from its text layer, or the title image still to be read by OCR.
+    # Returns (title, source, image); image is None unless the page needs OCR.
+    def find_title(self, page):
+        if self.title_strategy == 'auto':
+            with self.timer.stage('vector'):
+                bar = self.get_vector_title_bar(page)
+                raw = self.get_bar_text(page, bar) if bar is not None else ''
+            if raw.strip():
+                return self.clean_title(raw), 'vector', None
+        return None, 'none', self.get_title_image(page)
+
+    # Find the title bar among the filled vector drawings of the page. Uses the same
+    # position and size limits as the raster boxes; returns a rect in PDF points or None.
+    def get_vector_title_bar(self, page):
+        scale = 72 / self.ocr_dpi
+        top = fitz.Rect(self.top_bounds[2], self.top_bounds[0], self.top_bounds[3], self.top_bounds[1]) * scale
+        bars = []
+        for path in page.get_drawings():
+            fill = path.get('fill')
+            if not fill:
+                continue
+            # Dark fills only, like the inverted threshold of the raster path
+            if fill_luminance(fill) >= 0.5:
+                continue
+            rect = fitz.Rect(path['rect']) & top
+            if rect.is_empty:
+                continue
+            if (rect.x0 - top.x0) / scale < 200 and rect.width / scale > 500 and rect.height / scale > 50:
+                bars.append(rect)
+        if not bars:
+            return None
+        return sorted(bars, key=lambda rect: rect.width, reverse=True)[0]
+
+    # Read the text layer inside a title bar, one line per text line
+    def get_bar_text(self, page, bar):
+        lines = []
+        for block in page.get_text('dict', clip=bar)['blocks']:
+            for line in block.get('lines', []):
+                lines.append(''.join(span['text'] for span in line['spans']))
+        return '\n'.join(lines)
+
+    # Extract title of a page by rendering the title region and running OCR
+    def detect_raster_title(self, page):
+        img = self.get_title_image(page)
+        if img is None:
+            return None, 'none'
+        return self.read_title_image(img)
+
+    # Render the title region of a page and crop the inverted title bar for OCR, or None when
+    # there is no bar. With coarse_dpi the bar is found on a low-resolution render and only
+    # its rectangle is rendered at ocr_dpi.
+    def get_title_image(self, page):
+        bounds = self.top_bounds
+        if self.render_mode == 'clip' and self.coarse_dpi:
+            bounds = self.find_coarse_bar(page)
+            if bounds is None:
+                return None
+        with self.timer.stage('render'):
+            if self.render_mode == 'page':
+                region = self.get_page_image(page)[
+                    self.top_bounds[0]:self.top_bounds[1],
+                    self.top_bounds[2]:self.top_bounds[3]
+                ]
+            else:
+                # Keep the pixmap referenced while its samples are in use
+                pixmap = self.get_region_pixmap(page, bounds)
+                region = pixmap_to_array(pixmap)
+        with self.timer.stage('boxes'):
+            title_box = self.find_title_box(region, bounds)
+        if title_box is None:
             return None
-        title_box = self.get_title_box(boxes)
-        img = img[
-            title_box[0]:title_box[1],
-            title_box[2]:title_box[3]
+        img = region[
+            title_box[0] - bounds[0]:title_box[1] - bounds[0],
+            title_box[2] - bounds[2]:title_box[3] - bounds[2]
         ]
-        img = cv2.bitwise_not(img)
-        raw = image_to_string(img, lang='eng')
+        return cv2.bitwise_not(img)
+
+    # Read the title from a title image with OCR
+    def read_title_image(self, img):
+        with self.timer.stage('ocr'):
+            raw, source = self.ocr_title(img)
+        return self.clean_title(raw), source
+
+    # OCR an inverted title image, looking it up in the title cache first
+    def ocr_title(self, img):
+        cache = self.get_cache()
+        if cache is None:
+            return self.get_ocr().image_to_string(img), 'ocr'
+        key = cache.image_key(img, self.get_ocr().identity)
+        raw = cache.get(key)
+        if raw is not None:
+            return raw, 'cache'
+        raw = self.get_ocr().image_to_string(img)
+        cache.put(key, raw)
+        return raw, 'ocr'
+
+    # Join the recognized title lines and drop front-matter titles
+    def clean_title(self, raw):
         title = ' '.join([element for element in raw.replace('\x0c','').split('\n') if element.strip()])
         if 'table of contents' in title.lower():
             return None
@@ -101,19 +306,86 @@ class PDFProcessor:
         img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         return img_gray
 
+    # Render a region given in OCR pixel coordinates ([y0, y1, x0, x1]) as a grayscale pixmap
+    def get_region_pixmap(self, page, bounds):
+        clip = fitz.Rect(bounds[2], bounds[0], bounds[3], bounds[1]) * (72 / self.ocr_dpi)
+        return page.get_pixmap(dpi=self.ocr_dpi, colorspace=fitz.csGRAY, clip=clip, alpha=False)
+
+    # Find the title bar on a render of top_bounds at coarse_dpi, with the box limits scaled
+    # to that resolution and loosened by COARSE_SLACK pixels. Returns the bar widened by
+    # COARSE_SLACK pixels in OCR pixel coordinates ([y0, y1, x0, x1]), or None.
+    def find_coarse_bar(self, page):
+        scale = self.coarse_dpi / self.ocr_dpi
+        clip = fitz.Rect(self.top_bounds[2], self.top_bounds[0], self.top_bounds[3], self.top_bounds[1]) * (72 / self.ocr_dpi)
+        with self.timer.stage('render'):
+            pixmap = page.get_pixmap(dpi=self.coarse_dpi, colorspace=fitz.csGRAY, clip=clip, alpha=False)
+            region = pixmap_to_array(pixmap)
+        with self.timer.stage('boxes'):
+            # The pixmap starts at (pixmap.x, pixmap.y) on the page at coarse_dpi
+            left = self.top_bounds[2] * scale - pixmap.x
+            boxes = [box for box in self.get_boxes(region, kernel_size=max(1, round(5 * scale)), min_width=500 * scale - COARSE_SLACK)
+                     if box[0] - left < 200 * scale + COARSE_SLACK and box[2] > 500 * scale - COARSE_SLACK and box[3] > 50 * scale - COARSE_SLACK]
+        if not boxes:
+            return None
+        x, y, w, h = max(boxes, key=lambda box: box[2])
+        return [
+            max(self.top_bounds[0], math.floor((pixmap.y + y - COARSE_SLACK) / scale)),
+            min(self.top_bounds[1], math.ceil((pixmap.y + y + h + COARSE_SLACK) / scale)),
+            max(self.top_bounds[2], math.floor((pixmap.x + x - COARSE_SLACK) / scale)),
+            min(self.top_bounds[3], math.ceil((pixmap.x + x + w + COARSE_SLACK) / scale))
+        ]
+
+    # Title box ([y0, y1, x0, x1]) in a region rendered at ocr_dpi from bounds, or None
+    def find_title_box(self, region, bounds):
+        # Boxes are measured from the top_bounds origin, whatever part of it was rendered
+        top, left = bounds[0] - self.top_bounds[0], bounds[2] - self.top_bounds[2]
+        boxes = [(x + left, y + top, w, h) for x, y, w, h in self.get_boxes(region)]
+        boxes = [count for count in boxes if count[0] < 200 and count[2] > 500 and count[3] > 50]
+        if not boxes:
+            return None
+        return self.get_title_box(boxes)
+
+    # Get bounding boxes for image content with the selected detector
+    def get_boxes(self, img, kernel_size=5, min_width=500):
+        if self.box_detector == 'projection':
+            return self.get_projection_boxes(img, kernel_size, min_width)
+        return self.get_image_boxes(img, kernel_size)
+
     # Get bounding boxes for image content
-    def get_image_boxes(self, img):
+    def get_image_boxes(self, img, kernel_size=5):
         ret, th1 = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)
         ret, th2 = cv2.threshold(th1, 127, 255, cv2.THRESH_BINARY_INV)
-        kernel = np.ones((5, 5), np.uint8)
+        kernel = np.ones((kernel_size, kernel_size), np.uint8)
         img_dilated = cv2.dilate(th2, kernel, iterations=1)
         contours, _ = cv2.findContours(img_dilated, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
         contours = [cv2.boundingRect(cnt) for cnt in contours]
         return contours
 
-    # Determine which bounding box likely contains the title
+    # Get bounding boxes of dark bars from the row and column sums of the dark pixels. Bands
+    # of rows with at least min_width / 2 dark pixels are candidates; the bar of a band is its
+    # widest run of columns with dark pixels in the band, which also spans the light text on
+    # the bar. Boxes are grown like the dilated contours of get_image_boxes, so both
+    # detectors report the same bar.
+    def get_projection_boxes(self, img, kernel_size=5, min_width=500):
+        dark = img <= 127
+        # The dilation joins runs up to kernel_size - 1 pixels apart and grows them
+        gap = kernel_size - 1
+        before, after = kernel_size - 1 - kernel_size // 2, kernel_size // 2
+        height, width = dark.shape
+        boxes = []
+        for y0, y1 in true_runs(dark.sum(axis=1) * 2 >= min_width, gap):
+            band = dark[y0:y1]
+            x0, x1 = max(true_runs(band.any(axis=0), gap), key=lambda run: run[1] - run[0])
+            rows = np.flatnonzero(band[:, x0:x1].any(axis=1))
+            y0, y1 = y0 + int(rows[0]), y0 + int(rows[-1]) + 1
+            x0, y0 = max(0, x0 - before), max(0, y0 - before)
+            x1, y1 = min(width, x1 + after), min(height, y1 + after)
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+    # Determine which bounding box likely contains the title: the widest
     def get_title_box(self, boxes):
-        title_box = sorted(boxes, key=lambda x: x[2], reverse=True)[0]
+        title_box = max(boxes, key=lambda x: x[2])
         return [
             self.top_bounds[0] + title_box[1],
             self.top_bounds[0] + title_box[1] + title_box[3],
@@ -124,17 +396,29 @@ class PDFProcessor:
     # Extract meaningful words from a given text
     def parse_words(self, text):
         words_to_filter = []
-        words = [a.lower().strip() for a in list(TextBlob(text).noun_phrases) if len(a) > 1]
-        words += [a.lower().strip() for a in TextBlob(text).words if len(a) > 1]
-        words = list(set(words))
+        engine = self.get_nlp()
+        with self.timer.stage('tokenize'):
+            doc = engine.analyze(text)
+        with self.timer.stage('noun_phrases'):
+            words = [a.lower().strip() for a in engine.noun_phrases(doc) if len(a) > 1]
+        with self.timer.stage('tokenize'):
+            words += [a.lower().strip() for a in engine.words(doc) if len(a) > 1]
+            words = list(dict.fromkeys(words))
         
+        with self.timer.stage('filter_words'):
+            words_to_filter = self.filter_words(words)
+        return words_to_filter
+
+    # Drop stopwords, addresses and other non-terms from candidate words
+    def filter_words(self, words):
+        words_to_filter = []
         for i in range(len(words)):
             word = words[i]
-            if word in self.stopwords:
+            if word in self.stopword_set:
                 continue
-            if len(re.sub(r'[0-9a-zA-Z\-_\|\[\]\+\.\(\),\'"~ ]+', '', word)) > 0:
+            if not TERM_PATTERN.fullmatch(word):
                 continue
-            if re.findall(r'\d+\.\d+\.\d+\.\d+', word):
+            if IP_PATTERN.search(word):
                 continue
             if word[0] == '-':
                 continue
@@ -142,149 +426,707 @@ class PDFProcessor:
                 continue
             if word.startswith('0x'):
                 continue
-            word = re.sub(r'^\'|\'$', '', word).strip()
+            word = QUOTE_PATTERN.sub('', word).strip()
             words_to_filter.append(word)
         
         return words_to_filter
 
-    # Parse a single page of a PDF
-    def parse_page(self, content):
-        text = re.sub('\s*[\n0-9]*\n© [0-9]{4} [\w\s0-9\n]+© SANS Institute [0-9]{4}\n[a-f0-9]+\n.+@.+\n[0-9]+\n\w+ \w+\n.+\nlive\nLicensed To: \w+ \w+ <.+@.+> \w+ [0-9]+, [0-9]{4}\nLicensed To: \w+ \w+ <.+@.+> \w+ [0-9]+, [0-9]{4}\n', '', content)
-        pg_num = (re.findall(r'\n\d+\n©\s', content) or [''])[0].replace('\n', '').replace('©', '').strip()
+    # Parse a single page of a PDF. With learned boilerplate the footer lines are stripped
+    # and the page number read from them, otherwise the SANS footer regex is used.
+    def parse_page(self, content, boilerplate=None):
+        self.timer.start_page()
+        with self.timer.stage('strip'):
+            if boilerplate:
+                text, pg_num = boilerplate.strip(content)
+            else:
+                text = FOOTER_PATTERN.sub('', content)
+                pg_num = (PAGE_NUMBER_PATTERN.findall(content) or [''])[0].replace('\n', '').replace('©', '').strip()
         words = self.parse_words(text)
-        return {
+        element = {
             'page': pg_num,
             'words': words,
             'raw': content
         }
+        if self.timer.enabled:
+            element['timings'] = self.timer.page_timings()
+        return element
+
+    # Constructor arguments, used to rebuild an identical processor in worker processes
+    def settings(self):
+        return {
+            'top_bounds': self.top_bounds,
+            'ocr_dpi': self.ocr_dpi,
+            'coarse_dpi': self.coarse_dpi,
+            'box_detector': self.box_detector,
+            'stopwords': self.stopwords,
+            'render_mode': self.render_mode,
+            'ocr_backend': self.ocr_backend,
+            'title_cache': self.title_cache,
+            'title_cache_size': self.title_cache_size,
+            'title_strategy': self.title_strategy,
+            'nlp_engine': self.nlp_engine,
+            'strip_mode': self.strip_mode,
+            'profile': self.timer.enabled,
+            'profile_stage': self.timer.profile_stage,
+            'profile_dump': self.timer.profile_dump
+        }
+
+    # Settings that change the extracted pages; checkpoint journals are keyed by them
+    def output_settings(self):
+        ignored = ('title_cache', 'title_cache_size', 'profile', 'profile_stage', 'profile_dump')
+        return {key: value for key, value in self.settings().items() if key not in ignored}
+
+    # OCR the title and extract the text layer of a single page
+    def scan_page(self, doc, i):
+        return self.ocr_page(*self.render_page(doc, i))
+
+    # Render stage of a page: the title from the text layer or the title image left for
+    # ocr_page, and the text layer. Returns the scan record and the image (or None).
+    def render_page(self, doc, i):
+        self.timer.start_page()
+        page = doc.load_page(i)
+        title, title_source, img = self.find_title(page)
+        record = {
+            'index': i,
+            'title': title,
+            'title_source': title_source,
+            'text': page.get_text()
+        }
+        if self.timer.enabled:
+            record['timings'] = self.timer.page_timings()
+        return record, img
+
+    # OCR stage of a page: read the title image found by render_page
+    def ocr_page(self, record, img):
+        if img is None:
+            return record
+        self.timer.start_page()
+        record['title'], record['title_source'] = self.read_title_image(img)
+        if self.timer.enabled:
+            record['timings'] = {**record.get('timings', {}), **self.timer.page_timings()}
+        return record
+
+    # Skip pages before the first titled page and before the course banner, in page order.
+    # Yields each kept page together with the course title found so far.
+    def select_pages(self, scanned, quiet=False):
+        first = False
+        course_title = ""
+        for record in scanned:
+            if not first:
+                if record['title']:
+                    first = True
+                else:
+                    if not quiet:
+                        print(f'{record["index"]}: [NONE]')
+                    continue
+            if not course_title:
+                course_title = (re.findall(self.course_pattern, record['text']) or [''])[0]
+                if not course_title:
+                    continue
+            yield record, course_title
+
+    # Combine a scanned page with its parsed text
+    def make_page(self, record, element, quiet=False):
+        if not quiet:
+            print(f'{record["index"]}: {element["page"]}: {record["title"]}')
+        page = {'title': record['title'], 'title_source': record['title_source'], **element}
+        if 'timings' in record or 'timings' in element:
+            page['timings'] = {**record.get('timings', {}), **element.get('timings', {})}
+        return page
 
-    # Process an entire PDF file and read its contents
-    def read_book(self, pdf_path, quiet=False):
+    # Count where the title of a page scanned in this run came from; pages resumed from a
+    # journal are not counted again
+    def count_title_source(self, record):
+        self.title_sources[record['title_source']] += 1
+
+    # Scan a page, or take it from the book's journal when an earlier run recorded it
+    def scan_or_resume(self, doc, i, journal=None):
+        if journal is not None and i in journal.scans:
+            return journal.scans[i]
+        record = self.scan_page(doc, i)
+        self.count_title_source(record)
+        if journal is not None:
+            journal.add_scan(record)
+        return record
+
+    # Learn the boilerplate lines of a book from the text of all its pages
+    def learn_boilerplate(self, texts):
+        if self.strip_mode != 'learned':
+            return None
+        boilerplate = Boilerplate.learn(texts)
+        return boilerplate if boilerplate else None
+
+    # Parse a scanned page, or take it from the book's journal when an earlier run recorded it
+    def parse_or_resume(self, record, journal=None, boilerplate=None):
+        element = journal.get_page(record) if journal is not None else None
+        if element is None:
+            element = self.parse_page(record['text'], boilerplate)
+            if journal is not None:
+                journal.add_page(record['index'], element)
+        return element
+
+    # Read several books over one shared pool of worker processes. Each worker opens its
+    # own fitz documents; scan and parse tasks of all books share the pool, with parse
+    # tasks queued first so that books finish (and can be written) as early as possible.
+    # books are (book, pdf_path, journal) tuples; pages already in a journal are skipped.
+    # Yields (book, pdf_path, result) as each book finishes, where result is the
+    # read_book tuple, or the exception that stopped that book without stopping the others.
+    def read_books(self, books, workers, quiet=False):
+        jobs = {}
+        tasks = deque()
+        ready = []
+        # Each book is first opened by a worker, which keeps the document for its scan tasks
+        for key, (book, pdf_path, journal) in enumerate(books):
+            jobs[key] = {
+                'book': book,
+                'path': pdf_path,
+                'journal': journal,
+                'stage': 'open',
+                'remaining': 1,
+                'scans': dict(journal.scans) if journal is not None else {},
+                'elements': {}
+            }
+            tasks.append((key, 0, (_page_count, pdf_path)))
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.settings(),)) as pool:
+            running = {}
+            while tasks or running or ready:
+                # Books whose current stage is complete: queue their parse tasks or finish them
+                while ready:
+                    key = ready.pop()
+                    job = jobs[key]
+                    try:
+                        if job['stage'] == 'open':
+                            chunks = self.start_scan(job, workers)
+                            if chunks:
+                                tasks.extend((key, n, (_scan_pages, job['path'], indices)) for n, indices in enumerate(chunks))
+                                continue
+                        if job['stage'] == 'scan':
+                            batches = self.finish_scan(job, workers, quiet)
+                            if batches:
+                                tasks.extendleft(reversed([
+                                    (key, n, (_parse_pages, [record['text'] for record in batch], job['boilerplate']))
+                                    for n, batch in enumerate(batches)
+                                ]))
+                                continue
+                        result = self.finish_parse(job, quiet)
+                    except Exception as e:
+                        result = e
+                    del jobs[key]
+                    yield job['book'], job['path'], result
+                # Keep the pool busy without queueing every task up front
+                while tasks and len(running) < workers * 2:
+                    key, n, call = tasks.popleft()
+                    running[pool.submit(*call)] = (key, n)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, n = running.pop(future)
+                    job = jobs.get(key)
+                    if job is None:
+                        continue
+                    try:
+                        self.collect_result(job, n, future.result())
+                    except Exception as e:
+                        del jobs[key]
+                        tasks = deque(task for task in tasks if task[0] != key)
+                        yield job['book'], job['path'], e
+                        continue
+                    job['remaining'] -= 1
+                    if not job['remaining']:
+                        ready.append(key)
+
+    # The page count of a book is known: split the pages still to scan into chunks
+    def start_scan(self, job, workers):
+        missing = [i for i in range(job['page_count']) if i not in job['scans']]
+        chunks = [missing[start:stop] for start, stop in page_ranges(len(missing), workers)]
+        job['stage'] = 'scan'
+        job['remaining'] = len(chunks)
+        return chunks
+
+    # Store the result of a finished pool task of a book, and journal it
+    def collect_result(self, job, n, result):
+        journal = job['journal']
+        if job['stage'] == 'open':
+            job['page_count'] = result
+            return
+        if job['stage'] == 'scan':
+            for record in result:
+                job['scans'][record['index']] = record
+                self.count_title_source(record)
+                if journal is not None:
+                    journal.add_scan(record)
+            return
+        for record, element in zip(job['batches'][n], result):
+            job['elements'][record['index']] = element
+            if journal is not None:
+                journal.add_page(record['index'], element)
+
+    # All pages of a book are scanned: select pages in order and batch the ones still to parse
+    def finish_scan(self, job, workers, quiet=False):
+        job['boilerplate'] = self.learn_boilerplate(job['scans'][i]['text'] for i in range(job['page_count']))
+        scanned = (job['scans'][i] for i in range(job['page_count']))
+        selected = list(self.select_pages(scanned, quiet))
+        job['records'] = [record for record, _ in selected]
+        job['course_title'] = selected[-1][1] if selected else ""
+        to_parse = []
+        for record in job['records']:
+            element = job['journal'].get_page(record) if job['journal'] is not None else None
+            if element is None:
+                to_parse.append(record)
+            else:
+                job['elements'][record['index']] = element
+        job['batches'] = [to_parse[start:stop] for start, stop in page_ranges(len(to_parse), workers)]
+        job['stage'] = 'parse'
+        job['remaining'] = len(job['batches'])
+        return job['batches']
+
+    # All selected pages of a book are parsed: merge them back in page order
+    def finish_parse(self, job, quiet=False):
+        pages = [self.make_page(record, job['elements'][record['index']], quiet) for record in job['records']]
+        return self.book_result(pages, job['course_title'])
+
+    # Build the read_book return value from the kept pages
+    def book_result(self, pages, course_title):
+        course_code = course_title.split('|')[0].strip()
+        return pages, course_code, course_title, (len([p for p in pages if p['title']]))
+
+    # Read a book through a staged pipeline. One render thread finds the title bars and
+    # extracts the text layer (MuPDF is not thread-safe), ocr_workers threads read the title
+    # images, each with its own OCR engine, and nlp_workers processes parse the selected pages.
+    # With 0 OCR workers the render thread also runs OCR; with 0 NLP workers one thread of
+    # this process parses. Pages with a vector title skip the OCR stage. The stages are joined
+    # by bounded queues: at most window pages are rendered ahead of page order and at most two
+    # pages per NLP worker are parsed at a time, so a slow stage holds back the stages before
+    # it. Scans are put back in page order for select_pages and parsed pages are merged in
+    # page order; the journal is written from this thread only. With learned boilerplate,
+    # parsing waits until every page is scanned, as the boilerplate comes from all their text.
+    def read_book_pipelined(self, pdf_path, quiet=False, journal=None, ocr_workers=2, nlp_workers=1, window=None):
+        if ocr_workers < 0 or nlp_workers < 0:
+            raise ValueError(f'Pipeline worker counts cannot be negative: {ocr_workers} OCR, {nlp_workers} NLP')
+        window = window or 4 * (max(ocr_workers, 1) + max(nlp_workers, 1))
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        resumed = dict(journal.scans) if journal is not None else {}
+        ocr_queue = queue.Queue(maxsize=max(ocr_workers, 1) * 2)
+        scans = queue.Queue()
+        slots = threading.Semaphore(window)
+        stop = threading.Event()
+        texts = []
+
+        # Render stage; a page waits for a free slot in the window before it is rendered
+        def render():
+            try:
+                with fitz.open(pdf_path) as doc:
+                    for i in range(page_count):
+                        while not slots.acquire(timeout=0.1):
+                            if stop.is_set():
+                                return
+                        if i in resumed:
+                            scans.put((i, resumed[i], False))
+                            continue
+                        record, img = self.render_page(doc, i)
+                        # Without OCR workers the title images are read in this thread
+                        if img is None or not ocr_workers:
+                            scans.put((i, self.ocr_page(record, img), True))
+                        elif not put_until(ocr_queue, (record, img), stop):
+                            return
+            except Exception as e:
+                scans.put((None, e, False))
+            finally:
+                for _ in range(ocr_workers):
+                    put_until(ocr_queue, None, stop)
+
+        # OCR stage, until the render stage sends None
+        def ocr():
+            try:
+                while True:
+                    item = get_until(ocr_queue, stop)
+                    if item is None:
+                        return
+                    record = self.ocr_page(*item)
+                    scans.put((record['index'], record, True))
+            except Exception as e:
+                scans.put((None, e, False))
+
+        # Scanned pages in page order, journaled as they are taken
+        def ordered():
+            pending = {}
+            for i in range(page_count):
+                while i not in pending:
+                    index, record, new = scans.get()
+                    if index is None:
+                        raise record
+                    pending[index] = (record, new)
+                record, new = pending.pop(i)
+                slots.release()
+                if new:
+                    self.count_title_source(record)
+                    if journal is not None:
+                        journal.add_scan(record)
+                texts.append(record['text'])
+                yield record
+
+        # Merge a page whose parse is done, or was resumed from the journal
+        def merge(record, element, future):
+            if element is None:
+                element = future.result()[0]
+                if journal is not None:
+                    journal.add_page(record['index'], element)
+            return self.make_page(record, element, quiet)
+
+        threads = [threading.Thread(target=render, daemon=True)] + [threading.Thread(target=ocr, daemon=True) for _ in range(ocr_workers)]
+        if nlp_workers:
+            pool = ProcessPoolExecutor(max_workers=nlp_workers, initializer=_init_worker, initargs=(self.settings(),))
+        else:
+            pool = ThreadPoolExecutor(max_workers=1)
+        pages = []
+        course_title = ""
+        parsing = deque()
+        boilerplate = None
+        try:
+            for thread in threads:
+                thread.start()
+            selected = self.select_pages(ordered(), quiet)
+            if self.strip_mode == 'learned':
+                selected = list(selected)
+                boilerplate = self.learn_boilerplate(texts)
+            for record, course_title in selected:
+                element = journal.get_page(record) if journal is not None else None
+                future = None
+                if element is None:
+                    if nlp_workers:
+                        future = pool.submit(_parse_pages, [record['text']], boilerplate)
+                    else:
+                        future = pool.submit(lambda text: [self.parse_page(text, boilerplate)], record['text'])
+                parsing.append((record, element, future))
+                while parsing and (len(parsing) > max(nlp_workers, 1) * 2 or parsing[0][2] is None or parsing[0][2].done()):
+                    pages.append(merge(*parsing.popleft()))
+            while parsing:
+                pages.append(merge(*parsing.popleft()))
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            pool.shutdown(cancel_futures=True)
+        return self.book_result(pages, course_title)
+
+    # Process an entire PDF file and read its contents.
+    # With a journal, finished pages are checkpointed and pages recorded by an earlier run are skipped.
+    # pipeline (ocr_workers, nlp_workers) reads the book with read_book_pipelined.
+    def read_book(self, pdf_path, quiet=False, workers=1, journal=None, pipeline=None):
         if not os.path.exists(pdf_path):
             print(f"[ERROR] File {pdf_path} does not exist.")
             return
+        if pipeline is not None:
+            if workers > 1:
+                raise ValueError('A pipeline reads one book at a time; it cannot be combined with several workers')
+            return self.read_book_pipelined(pdf_path, quiet, journal, *pipeline)
+        if workers > 1:
+            for _, _, result in self.read_books([(None, pdf_path, journal)], workers, quiet):
+                if isinstance(result, Exception):
+                    raise result
+                return result
         with fitz.open(pdf_path) as doc:
             pages = []
-            first = False
             course_title = ""
-            for i in range(doc.page_count):
-                page = doc.load_page(i)
-                title = self.get_page_title(page)
-                if not first:
-                    if title:
-                        first = True
-                    else:
-                        if not quiet:
-                            print(f'{i}: [NONE]')
-                        continue
-                text = page.get_text()
-                if not course_title:
-                    course_title = (re.findall(self.course_pattern, text) or [''])[0]
-                    if not course_title:
-                        continue
-                element = self.parse_page(text)
-                if not quiet:
-                    print(f'{i}: {element["page"]}: {title}')
-                pages.append({'title': title, **element})
-            course_code = course_title.split('|')[0].strip()
-        return pages, course_code, course_title, (len([p for p in pages if p['title']]))
+            boilerplate = None
+            scanned = (self.scan_or_resume(doc, i, journal) for i in range(doc.page_count))
+            # The boilerplate is learned from the text of all pages, so they are scanned first
+            if self.strip_mode == 'learned':
+                scanned = list(scanned)
+                boilerplate = self.learn_boilerplate(record['text'] for record in scanned)
+            for record, course_title in self.select_pages(scanned, quiet):
+                element = self.parse_or_resume(record, journal, boilerplate)
+                pages.append(self.make_page(record, element, quiet))
+        return self.book_result(pages, course_title)
+
+
+# Split a page count into contiguous ranges, several per worker so that
+# slow pages (large title bars, dense text) do not leave workers idle
+def page_ranges(page_count, workers, per_worker=4):
+    size = max(1, -(-page_count // (workers * per_worker)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+# Put an item on a bounded queue, waiting for room until stop is set. Returns False when stopped.
+def put_until(bounded, item, stop):
+    while not stop.is_set():
+        try:
+            bounded.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+# Take an item from a queue, waiting until stop is set. Returns None when stopped.
+def get_until(bounded, stop):
+    while not stop.is_set():
+        try:
+            return bounded.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+# Per-process state of the extraction pool: a processor and the documents opened so far
+_worker = {}
+
+# Pool initializer: build this worker's PDFProcessor from the parent's settings
+def _init_worker(settings):
+    _worker['processor'] = PDFProcessor(**settings)
+    _worker['docs'] = {}
+
+# Open a PDF once per worker process and reuse it for later page ranges
+def _worker_doc(pdf_path):
+    if pdf_path not in _worker['docs']:
+        _worker['docs'][pdf_path] = fitz.open(pdf_path)
+    return _worker['docs'][pdf_path]
+
+# Pool task: open a PDF in this worker and return its page count
+def _page_count(pdf_path):
+    return _worker_doc(pdf_path).page_count
+
+# Pool task: scan the given pages of a PDF
+def _scan_pages(pdf_path, indices):
+    doc = _worker_doc(pdf_path)
+    records = [_worker['processor'].scan_page(doc, i) for i in indices]
+    _worker['processor'].timer.dump()
+    return records
+
+# Pool task: parse the text of a batch of selected pages
+def _parse_pages(texts, boilerplate=None):
+    elements = [_worker['processor'].parse_page(text, boilerplate) for text in texts]
+    _worker['processor'].timer.dump()
+    return elements
 
 
 # Class to create LaTeX index
 class IndexCreator:
-    # Initialize class with the course code, output PDF file, and maximum pages
-    def __init__(self, course_code, output_pdf, MAX_PAGES):
+    # Initialize class with the course code, output PDF file, and maximum pages.
+    # With memory_budget (bytes) the index is built on disk in spill_dir once it is reached.
+    # makeindex 'external' runs makeindex, 'native' sorts the index in-process; compare_makeindex
+    # also runs makeindex and reports any difference from the native output. renderer 'latex'
+    # typesets main.ind with pdflatex, 'native' lays the index out directly with PyMuPDF.
+    # Stages whose inputs are unchanged since the last build are skipped unless rebuild is set.
+    def __init__(self, course_code, output_pdf, MAX_PAGES, memory_budget=None, spill_dir=None, makeindex='external',
+                 compare_makeindex=False, renderer='latex', rebuild=False):
         self.course_code = course_code
         self.output_pdf = output_pdf
         self.MAX_PAGES = int(MAX_PAGES)
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.makeindex = makeindex
+        self.compare_makeindex = compare_makeindex
+        self.renderer = renderer
+        self.rebuild = rebuild
+
+    # Empty inverted index of all books. Terms that filter_word_dictionary would remove are
+    # dropped while it is built, so it must be filtered with at most these limits.
+    def new_word_dictionary(self):
+        return InvertedIndex(max_count=self.MAX_PAGES, max_length=MAX_TERM_LENGTH, drop_spaces=True,
+                             memory_budget=self.memory_budget, spill_dir=self.spill_dir)
 
-    # Build a dictionary of words from the provided PDF(s) and their parsed pages
+    # Add the words of a book's parsed pages to the inverted index of all books
     def build_word_dictionary(self, book, pages, wd=None):
-        word_dictionary = {}
+        word_dictionary = self.new_word_dictionary()
         if wd is not None:
             word_dictionary = wd
-        for p in pages:
-            for w in p[2:]:
-                if w is not None:
-                    if w == p[0]:
-                        continue
-                    if w not in word_dictionary:
-                        word_dictionary[w] = {
-                            'count': 1,
-                            'books': {
-                                book: {
-                                    p[0]: 1
-                                }
-                            }
-                        }
-                    continue
-                word_dictionary[w]['count'] += 1
-                if book not in word_dictionary[w]['books']:
-                    word_dictionary[w]['books'][book] = {
-                        p[0]: 1
-                    }
-                    continue
-                if p[0] not in word_dictionary[w]['books'][book]:
-                    word_dictionary[w]['books'][book][p[0]] = 1
-                else:
-                    word_dictionary[w]['books'][book][p[0]] += 1
+        word_dictionary.add_pages(book, pages)
         return word_dictionary
 
     # Filter the word dictionary based on given parameters
-    def filter_word_dictionary(self, word_dictionary, min_count=1, max_count=10, max_length=30):
-        res = {}
-        for w in word_dictionary:
-            if ' ' in w:
-                continue
-            if word_dictionary[w]['count'] < min_count:
-                continue
-            if len(w) > max_length:
-                continue
-            page_count = sum([len(word_dictionary[w]['books'][b]) for b in word_dictionary[w]['books']])
-            if page_count < max_count:
-                res[w] = word_dictionary[w]
-        return res
-
-    # Read all generated CSV files from the course path
-    def read_all_csvs(self, course_path):
-        word_dictionary = {}
-        titles = []
-        i = 1
-        while os.path.exists(os.path.join(course_path, f'{i}.csv')):
-            pages = []
-            try:
-                with open(os.path.join(course_path, f'{i}.csv')) as f:
-                    csv_reader = csv.reader(f, delimiter=',', quotechar='"')
-                    for row in csv_reader:
-                        pages.append(row)
-            except FileNotFoundError:
-                print(f"[ERROR] CSV file {i}.csv not found in {course_path}")
-            except PermissionError:
-                print(f"[ERROR] Permission denied when trying to read {i}.csv")
-            except Exception as e:
-                print(f"[ERROR] An error occurred while reading the CSV file: {e}")
+    def filter_word_dictionary(self, word_dictionary, min_count=1, max_count=10, max_length=MAX_TERM_LENGTH):
+        return word_dictionary.filter(min_count=min_count, max_count=max_count, max_length=max_length)
+
+    # Read the rows (page, title, *words) of a book from its term store
+    def read_term_store(self, path):
+        pages = []
+        try:
+            with TermStore(path) as store:
+                pages = list(store.rows())
+        except FileNotFoundError:
+            print(f"[ERROR] Term store {path} not found")
+        except PermissionError:
+            print(f"[ERROR] Permission denied when trying to read {path}")
+        except Exception as e:
+            print(f"[ERROR] An error occurred while reading the term store: {e}")
+        return pages
+
+    # Read the rows (page, title, *words) of a book from an exported CSV file
+    def read_csv(self, path):
+        pages = []
+        try:
+            with open(path) as f:
+                csv_reader = csv.reader(f, delimiter=',', quotechar='"')
+                for row in csv_reader:
+                    pages.append(row)
+        except FileNotFoundError:
+            print(f"[ERROR] CSV file {path} not found")
+        except PermissionError:
+            print(f"[ERROR] Permission denied when trying to read {path}")
+        except Exception as e:
+            print(f"[ERROR] An error occurred while reading the CSV file: {e}")
+        return pages
 
-            titles.append([{'page': a[0], 'title': a[1]} for a in pages if len(a) > 1 and a[1]])
-            word_dictionary = self.build_word_dictionary(i, pages, word_dictionary)
+    # Paths of the generated books of a course in book order: the term store of each book, or
+    # its CSV file for books that were only exported as CSV. When a book has both, the newer
+    # one is used, so a book regenerated as CSV (pdf_to_csv.py) is not shadowed by an old
+    # term store.
+    def book_paths(self, course_path):
+        paths = []
+        i = 1
+        while True:
+            store_path = os.path.join(course_path, f'{i}.terms')
+            csv_path = os.path.join(course_path, f'{i}.csv')
+            if os.path.exists(store_path) and os.path.exists(csv_path):
+                if os.path.getmtime(csv_path) > os.path.getmtime(store_path):
+                    print(f"[WARNING] {csv_path} is newer than {store_path}. Using the CSV file.")
+                    paths.append(csv_path)
+                else:
+                    paths.append(store_path)
+            elif os.path.exists(store_path):
+                paths.append(store_path)
+            elif os.path.exists(csv_path):
+                paths.append(csv_path)
+            else:
+                return paths
             i += 1
+
+    # Read the generated books at paths (see book_paths) through their persisted segments
+    # (courses/CODE/segments/{i}.npz).
+    # Only the segments of books that changed since the last build are rebuilt; the word
+    # dictionary is then combined from all segments and equals the one built by adding every
+    # book's pages to one index. With a memory budget each segment is added as a spilled run
+    # as soon as it is read, so only one book's postings are in memory at a time.
+    def read_book_segments(self, course_path, manifest, paths):
+        segment_dir = os.path.join(course_path, 'segments')
+        os.makedirs(segment_dir, exist_ok=True)
+        limits = {'max_count': self.MAX_PAGES, 'max_length': MAX_TERM_LENGTH, 'drop_spaces': True}
+        titles = []
+        segments = []
+        word_dictionary = self.new_word_dictionary() if self.memory_budget else None
+        for i, path in enumerate(paths, 1):
+            segment_path = os.path.join(segment_dir, f'{i}.npz')
+            key = fingerprint([path], limits)
+            segment = None
+            if self.is_current(manifest, f'segment{i}', key, [segment_path]):
+                try:
+                    segment, book_titles = read_segment(segment_path, i)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"[WARNING] Could not read segment {segment_path}: {e}. Rebuilding it.")
+            if segment is None:
+                pages = self.read_term_store(path) if path.endswith('.terms') else self.read_csv(path)
+                book_titles = [(a[0], a[1]) for a in pages if len(a) > 1 and a[1]]
+                segment = self.build_word_dictionary(i, pages)
+                write_segment(segment_path, segment, book_titles)
+                manifest.record(f'segment{i}', key)
+            titles.append([{'page': page, 'title': title} for page, title in book_titles])
+            if self.memory_budget:
+                word_dictionary.add_book_run(i, segment)
+                segment.close()
+            else:
+                segments.append((i, segment))
+        if not self.memory_budget:
+            word_dictionary = InvertedIndex.combine(segments, **limits)
+            for _, segment in segments:
+                segment.close()
         return titles, word_dictionary
 
     # Create LaTeX index title entries
     def make_title_entries(self, titles):
-        res = []
         for i in range(len(titles)):
+            book = str(i + 1)
             for title in titles[i]:
-                res.append('\indexentry{1' + str(i) + 'A@\\textbf{Book ' + str(i + 1) + '}!' + title['page'] + '@' + title['title'] + '|book{' + str(i + 1) + '}}{' + title['page'] + '}')
-        return res
+                yield f'\\indexentry{{1{i}A@\\textbf{{Book {book}}}!{title["page"]}@{title["title"]}|book{{{book}}}}}{{{title["page"]}}}'
 
-    # Create LaTeX index listing entries
+    # Create LaTeX index listing entries. Runs of consecutive pages of a term in a book are
+    # written as one page range (|( and |) entries) instead of one entry per page. All books
+    # share the page list of a term, so a run that other books' pages fall into stays as
+    # single pages, like makeindex would print it.
     def make_index_entries(self, word_dictionary):
-        res = []
-        for w in word_dictionary:
-            for b in word_dictionary[w]['books']:
-                for p in word_dictionary[w]['books'][b]:
-                    res.append('\indexentry{' + w.replace('_','\_').replace('"','\\"') + '|book{' + str(b) + '}}{' + str(p) + '}')
-        return res
+        for w, postings in groupby(word_dictionary.entries(), key=lambda entry: entry[0]):
+            key = w.translate(IDX_ESCAPES)
+            books = {}
+            for _, b, p in postings:
+                books.setdefault(b, []).append(str(p))
+            numbers = {b: sorted(int(p) for p in pages if p.isdigit() and str(int(p)) == p) for b, pages in books.items()}
+            for b, pages in books.items():
+                others = sorted(int(p) for other, values in books.items() if other != b for p in values if p.isdigit())
+                for p in pages:
+                    if not (p.isdigit() and str(int(p)) == p):
+                        yield f'\\indexentry{{{key}|book{{{b}}}}}{{{p}}}'
+                values = numbers[b]
+                start = 0
+                for end in range(1, len(values) + 1):
+                    if end < len(values) and values[end] == values[end - 1] + 1:
+                        continue
+                    first, last = values[start], values[end - 1]
+                    if end - start >= RANGE_MIN_PAGES and bisect_right(others, last) == bisect_left(others, first):
+                        yield f'\\indexentry{{{key}|(book{{{b}}}}}{{{first}}}'
+                        yield f'\\indexentry{{{key}|)book{{{b}}}}}{{{last}}}'
+                    else:
+                        for n in values[start:end]:
+                            yield f'\\indexentry{{{key}|book{{{b}}}}}{{{n}}}'
+                    start = end
+
+    # Stream the title and index entries to an .idx file in buffered chunks
+    def write_idx(self, path, titles, word_dictionary, chunk_size=IDX_CHUNK_LINES):
+        with open(path, 'w') as idx_file:
+            chunk = []
+            for entry in chain(self.make_title_entries(titles), self.make_index_entries(word_dictionary)):
+                chunk.append(entry)
+                if len(chunk) >= chunk_size:
+                    idx_file.write('\n'.join(chunk) + '\n')
+                    chunk = []
+            if chunk:
+                idx_file.write('\n'.join(chunk) + '\n')
+
+    # Sort the entries of main.idx into main.ind in-process, optionally comparing with makeindex
+    def write_ind(self, course_path):
+        idx_path = os.path.join(course_path, 'main.idx')
+        ind_path = os.path.join(course_path, 'main.ind')
+        style = 'std.ist' if os.path.exists('std.ist') else None
+        try:
+            rejected, warnings = make_ind(idx_path, ind_path, style)
+        except IOError as e:
+            print(f"[ERROR] An error occurred while writing main.ind: {e}")
+            sys.exit(1)
+        for line_number, line, reason in rejected:
+            print(f"[WARNING] main.idx:{line_number}: {reason}: {line}")
+        for warning in warnings:
+            print(f"[WARNING] {warning}")
+        if not self.compare_makeindex:
+            return
+        try:
+            diff = compare_with_makeindex(idx_path, ind_path, style)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"[WARNING] Could not run makeindex for comparison: {e}")
+            return
+        if diff:
+            diff_path = ind_path + '.diff'
+            with open(diff_path, 'w') as f:
+                f.writelines(diff)
+            print(f"[WARNING] main.ind differs from makeindex output, see {diff_path}")
+        else:
+            print('main.ind matches makeindex output')
+
+    # Sort main.idx and render it straight to the output PDF, without LaTeX
+    def render_native(self, course_path):
+        style = 'std.ist' if os.path.exists('std.ist') else None
+        try:
+            rejected, warnings = render_index(os.path.join(course_path, 'main.idx'), self.output_pdf, style,
+                                              title=f'{self.course_code} Index')
+        except (IOError, RuntimeError) as e:
+            print(f"[ERROR] An error occurred while rendering the index PDF: {e}")
+            sys.exit(1)
+        for line_number, line, reason in rejected:
+            print(f"[WARNING] main.idx:{line_number}: {reason}: {line}")
+        for warning in warnings:
+            print(f"[WARNING] {warning}")
+
+    # True when a stage of the last build can be reused
+    def is_current(self, manifest, stage, key, outputs):
+        return not self.rebuild and manifest.is_current(stage, key, outputs)
 
     # Create LaTeX index
     def create(self):
@@ -303,69 +1145,110 @@ class IndexCreator:
             print('Course does not exist')
             sys.exit(1)
 
-        # Read all CSVs
-        try:
-            titles, books = self.read_all_csvs(course_path)
-        except Exception as e:
-            print(f"An error occurred while reading CSV files: {e}")
-            sys.exit(1)
-            
-        # Filter word dictionary
-        try:
-            books = self.filter_word_dictionary(books, min_count=1, max_count=self.MAX_PAGES)
-        except Exception as e:
-            print(f"An error occurred while filtering the word dictionary: {e}")
-            sys.exit(1)
+        # Fingerprint every stage from its inputs and the stage before it, and stop if the
+        # PDF was built from the same inputs. The term table for sans_search is written with
+        # main.idx from the same word dictionary.
+        manifest = BuildManifest(os.path.join(course_path, 'build.json'))
+        idx_path = os.path.join(course_path, 'main.idx')
+        table_path = os.path.join(course_path, 'terms.table')
+        ind_path = os.path.join(course_path, 'main.ind')
+        paths = self.book_paths(course_path)
+        idx_key = fingerprint(paths, {'min_count': 1, 'max_count': self.MAX_PAGES, 'max_length': MAX_TERM_LENGTH, 'ranges': True})
+        ind_key = fingerprint(['std.ist'], {'makeindex': self.makeindex}, idx_key)
+        if self.renderer == 'native':
+            pdf_key = fingerprint(['std.ist'], {'renderer': 'native', 'output': self.output_pdf}, idx_key)
+        else:
+            pdf_key = fingerprint(['main.tex'], {'renderer': 'latex', 'output': self.output_pdf}, ind_key)
+        if self.is_current(manifest, 'pdf', pdf_key, [self.output_pdf, table_path]) and not self.compare_makeindex:
+            print(f'{self.output_pdf} is up to date')
+            return
 
-        # Make title and index entries
-        try:
-            title_entries = self.make_title_entries(titles)
-            index_entries = self.make_index_entries(books)
-        except Exception as e:
-            print(f"An error occurred while making title or index entries: {e}")
-            sys.exit(1)
+        if self.is_current(manifest, 'idx', idx_key, [idx_path, table_path]):
+            print('main.idx is up to date')
+        else:
+            # Read all books
+            try:
+                titles, word_dictionary = self.read_book_segments(course_path, manifest, paths)
+            except Exception as e:
+                print(f"An error occurred while reading the books: {e}")
+                sys.exit(1)
 
-        res = '\n'.join(title_entries) + '\n' + '\n'.join(index_entries)
-        
-        # Write to the main.idx file
-        try:
-            with open(os.path.join(course_path, 'main.idx'), 'w') as idx_file:
-                idx_file.write(res)
-        except IOError as e:
-            print(f"An error occurred while writing to the main.idx file: {e}")
-            sys.exit(1)
+            # Filter word dictionary
+            try:
+                books = self.filter_word_dictionary(word_dictionary, min_count=1, max_count=self.MAX_PAGES)
+            except Exception as e:
+                print(f"An error occurred while filtering the word dictionary: {e}")
+                sys.exit(1)
 
-        # Run shell commands for LaTeX and PDF creation
-        try:
-            subprocess.run(['makeindex', 'main.idx', '-s', 'std.ist'], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"[ERROR] An error occurred while running 'makeindex': {e}")
-            sys.exit(1)
+            # Write the term table of the terms in main.idx for lookups. Pruning depends on how
+            # the index was built (one index or per-book segments), the filter does not.
+            try:
+                word_dictionary.write_term_table(table_path, books.term_ids)
+            except IOError as e:
+                print(f"An error occurred while writing the term table: {e}")
+                sys.exit(1)
+
+            # Write the title and index entries to the main.idx file
+            try:
+                self.write_idx(idx_path, titles, books)
+            except IOError as e:
+                print(f"An error occurred while writing to the main.idx file: {e}")
+                sys.exit(1)
+            except Exception as e:
+                print(f"An error occurred while making title or index entries: {e}")
+                sys.exit(1)
+            manifest.record('idx', idx_key)
+
+        # Lay out the index directly, skipping makeindex and pdflatex
+        if self.renderer == 'native':
+            self.render_native(course_path)
+            manifest.record('pdf', pdf_key)
+            return
 
+        # Sort the index entries into main.ind
+        if self.is_current(manifest, 'ind', ind_key, [ind_path]) and not self.compare_makeindex:
+            print('main.ind is up to date')
+        elif self.makeindex == 'external':
+            # makeindex writes main.ind and main.ilg next to main.idx in the course folder
+            try:
+                subprocess.run(['makeindex', 'main.idx', '-s', os.path.abspath('std.ist')], cwd=course_path, check=True)
+            except subprocess.CalledProcessError as e:
+                print(f"[ERROR] An error occurred while running 'makeindex': {e}")
+                sys.exit(1)
+            manifest.record('ind', ind_key)
+        else:
+            self.write_ind(course_path)
+            manifest.record('ind', ind_key)
+
+        # Run shell commands for LaTeX and PDF creation in the course folder, where main.ind is
         try:
-            subprocess.run(['cp', 'main.tex', 'main.tex'], check=True)
+            subprocess.run(['cp', 'main.tex', os.path.join(course_path, 'main.tex')], check=True)
         except subprocess.CalledProcessError as e:
             print(f"[ERROR] An error occurred while running 'cp': {e}")
             sys.exit(1)
 
         try:
-            subprocess.run(['pdflatex', '-synctex=1', '-interaction=nonstopmode', 'main.tex'], check=True)
+            subprocess.run(['pdflatex', '-interaction=nonstopmode', 'main.tex'], cwd=course_path, check=True)
         except subprocess.CalledProcessError as e:
             print(f"[ERROR] An error occurred while running LaTeX commands: {e}")
             sys.exit(1)
 
-        # Remove temporary files
-        try:
-            for f in ['main.aux', 'main.log', 'main.ilg', 'main.tex', 'main.ind', 'main.synctex.gz']:
+        # Remove temporary files; main.ind is kept as the output of the 'ind' stage, and
+        # main.ilg is only there when makeindex ran in this build
+        for f in ['main.aux', 'main.log', 'main.ilg', 'main.tex']:
+            try:
                 os.remove(os.path.join(course_path, f))
-        except FileNotFoundError as e:
-            print(f"An error occurred while deleting temporary files: {e}")
+            except FileNotFoundError as e:
+                if f != 'main.ilg':
+                    print(f"An error occurred while deleting temporary files: {e}")
 
         # Move the PDF
         try:
             os.rename(os.path.join(course_path, 'main.pdf'), self.output_pdf)
         except OSError as e:
             print(f"An error occurred while renaming/moving the file: {e}")
+            return
+        manifest.record('pdf', pdf_key)
 
 # Main function to handle CLI arguments and execute the script
 def main():
@@ -376,10 +1259,32 @@ def main():
         parser.add_argument('-b', '--books', nargs='+', help='Book number(s)', required=False)
         parser.add_argument('-s', '--source', nargs='+', help='Source PDF files', required=True)
         parser.add_argument('-c', '--course', help='Course code', required=False)
-        parser.add_argument('-o1', '--output_csv', help='Output directory for CSV files', required=False, default=".")
+        parser.add_argument('-o1', '--output_csv', help='Output directory for the extracted books', required=False, default=".")
+        parser.add_argument('--export-csv', action='store_true', help='Also write each book as a CSV file (page, title, words)')
         parser.add_argument('-o2', '--output_pdf', help='Output path/filename for finished PDF index', required=False, default="index.pdf")
         parser.add_argument('-f', '--freq_limit', type=int, help='Set limit for occurances of words', required=False, default=10)
+        parser.add_argument('--index-memory', type=int, help='Memory budget in MB for building the index; postings beyond it are spilled to disk', required=False)
+        parser.add_argument('--spill-dir', help='Directory for the index postings spilled with --index-memory (default: system temp)', required=False)
+        parser.add_argument('--makeindex', choices=['native', 'external'], help='Sort the index with the makeindex program (external) or in-process (native; check it with --compare-makeindex first)', required=False, default='external')
+        parser.add_argument('--renderer', choices=['latex', 'native'], help='Typeset the index PDF with pdflatex (latex) or lay it out directly with PyMuPDF (native)', required=False, default='latex')
+        parser.add_argument('--rebuild', action='store_true', help='Rebuild every stage of the index, even when its inputs are unchanged since the last build')
+        parser.add_argument('--compare-makeindex', action='store_true', help='Also run makeindex and report differences from the native index (written to main.ind.diff)')
         parser.add_argument('--stopwords', type=str, help='Path to the stopword text file', required=False)
+        parser.add_argument('-w', '--workers', type=int, help='Number of worker processes for page extraction', required=False, default=1)
+        parser.add_argument('--pipeline', nargs=2, type=int, metavar=('OCR', 'NLP'), help='Read each book through a staged pipeline with this many OCR threads and NLP processes (0 NLP: one thread), overlapping rendering, OCR and term extraction (not with -w above 1)', required=False)
+        parser.add_argument('--ocr', choices=['auto', 'tesserocr', 'pytesseract'], help='OCR backend for page titles (auto prefers the in-process tesserocr engine)', required=False, default='auto')
+        parser.add_argument('--title-strategy', choices=['auto', 'ocr'], help='Read titles from the PDF text layer inside vector title bars, with OCR as fallback (auto), or always OCR', required=False, default='auto')
+        parser.add_argument('--title-cache', help='Path of the persistent OCR title cache (default: title_cache.sqlite in the CSV output directory)', required=False)
+        parser.add_argument('--title-cache-size', type=int, help='Maximum number of cached titles', required=False, default=50000)
+        parser.add_argument('--no-title-cache', action='store_true', help='Always run OCR on page titles')
+        parser.add_argument('--resume', action='store_true', help='Skip pages checkpointed by an interrupted run of the same PDFs and settings')
+        parser.add_argument('--profile', help='Write per-stage and per-book timings as JSON to this path', required=False)
+        parser.add_argument('--profile-stage', choices=STAGES, help='Also run cProfile on this stage (written next to the --profile JSON as .prof)', required=False)
+        parser.add_argument('--nlp', choices=['textblob', 'fast'], help='Term extraction engine: TextBlob (reference term set) or a single-pass tokenizer and chunker', required=False, default='textblob')
+        parser.add_argument('--strip', choices=['learned', 'regex'], help='Remove lines repeated across the pages of a book (learned) or only the SANS license footer (regex)', required=False, default='learned')
+        parser.add_argument('--coarse-dpi', type=int, help='Find the title bar on a render at this DPI first and render only the bar at full resolution (0 disables)', required=False, default=60)
+        parser.add_argument('--box-detector', choices=['contour', 'projection'], help='Find the title bar with OpenCV contours or with the row and column sums of the dark pixels', required=False, default='contour')
+        parser.add_argument('--render', choices=['clip', 'page'], help='Render only the title-bar region in grayscale (clip) or the whole page (page)', required=False, default='clip')
         return parser.parse_args()
 
     def read_stopwords(stopwords_file):
@@ -400,52 +1305,159 @@ def main():
                 print(f"[ERROR] Skipping processing for {source_file} due to unlocking failure.")
 
 
+    def read_books_sequentially(pdf_processor, books, pipeline=None):
+        # Read one book after another, reporting failures per book
+        for book_num, source_file, journal in books:
+            print(f'Reading {source_file}')
+            try:
+                result = pdf_processor.read_book(source_file, journal=journal, pipeline=pipeline)
+            except Exception as e:
+                result = e
+            yield book_num, source_file, result
+
+    def write_store(store_path, book_num, pages):
+        # Write the parsed data to the book's binary term store
+        try:
+            write_term_store(store_path, pages)
+            print(f'Wrote term store {book_num}.terms')
+            return True
+        except FileNotFoundError:
+            print(f"[ERROR] Could not find the directory to write the term store: {store_path}")
+        except PermissionError:
+            print(f"[ERROR] Permission denied when trying to write to {store_path}")
+        except Exception as e:
+            print(f"[ERROR] An error occurred while writing the term store: {e}")
+        return False
+
+    def write_fulltext(output_dir, book_num, pages):
+        # Write the raw page text and its positional index for full-text search
+        try:
+            write_page_store(os.path.join(output_dir, f"{book_num}.pages"), pages)
+            write_fulltext_index(os.path.join(output_dir, f"{book_num}.fts"), pages)
+            print(f'Wrote full-text index {book_num}.fts')
+            return True
+        except PermissionError:
+            print(f"[ERROR] Permission denied when trying to write the full-text index of book {book_num} to {output_dir}")
+        except Exception as e:
+            print(f"[ERROR] An error occurred while writing the full-text index: {e}")
+        return False
+
+    def write_csv(csv_file_path, book_num, pages):
+        # Write the parsed data to a CSV file; words keep their order so reruns are byte-identical
+        try:
+            with open(csv_file_path, 'w') as csv_file:
+                writer = csv.writer(csv_file)
+                for page in pages:
+                    writer.writerow([page['page'], page['title'], *list(dict.fromkeys(page['words']))])
+            print(f'Wrote CSV file {book_num}.csv')
+            return True
+        except FileNotFoundError:
+            print(f"[ERROR] Could not find the directory to write the CSV file: {csv_file_path}")
+        except PermissionError:
+            print(f"[ERROR] Permission denied when trying to write to {csv_file_path}")
+        except Exception as e:
+            print(f"[ERROR] An error occurred while writing the CSV file: {e}")
+        return False
+
     def process_pdfs(args, stopwords):
-        # Process each PDF file
+        # Check if specified output directory exists; if not, create it
+        output_csv = args.output_csv
+        if not os.path.exists(output_csv):
+            try:
+                os.makedirs(output_csv)
+            except OSError as e:
+                print(f"[ERROR] An error occurred while creating the directory: {e}")
+                sys.exit(1)
+
+        # Initialize PDFProcessor with specified top bounds, OCR DPI, and stopwords
+        report = ProfileReport() if args.profile else None
+        profile_dump = os.path.splitext(args.profile)[0] + '.prof' if args.profile and args.profile_stage else None
+        title_cache = None
+        if not args.no_title_cache:
+            title_cache = args.title_cache or os.path.join(output_csv, 'title_cache.sqlite')
+        pdf_processor = PDFProcessor(top_bounds=[320, 550, 250, 2300], ocr_dpi=300, stopwords=stopwords, render_mode=args.render,
+                                     ocr_backend=args.ocr, title_cache=title_cache, title_cache_size=args.title_cache_size,
+                                     title_strategy=args.title_strategy, profile=bool(args.profile), profile_stage=args.profile_stage,
+                                     profile_dump=profile_dump, nlp_engine=args.nlp, strip_mode=args.strip, coarse_dpi=args.coarse_dpi,
+                                     box_detector=args.box_detector)
+
+        # Collect the books to process, each with a page checkpoint journal next to its output
+        books = []
         for book_num, source_file in zip(args.books, args.source):
             # Check if the source file exists
             if not os.path.exists(source_file):
                 print(f'[ERROR] File {source_file} does not exist')
                 continue
-            # Initialize PDFProcessor with specified top bounds, OCR DPI, and stopwords
-            pdf_processor = PDFProcessor(top_bounds=[320, 550, 250, 2300], ocr_dpi=300, stopwords=stopwords)
-            # Open PDF file using fitz/pymupdf library
-            with fitz.open(source_file) as doc:
-                print(f'Reading {source_file}')
-                
-                # Process the entire PDF and get details like course_code, course_title, etc.
-                pages, course_code, course_title, page_count = pdf_processor.read_book(source_file)
-                print(f'{page_count} pages found')
-                
-                # Check if specified output directory exists; if not, create it
-                output_csv = args.output_csv
-                if not os.path.exists(output_csv):
-                    try:
-                        os.makedirs(output_csv)
-                    except OSError as e:
-                        print(f"[ERROR] An error occurred while creating the directory: {e}")
-                        sys.exit(1)
-                
-                # Generate the CSV file path
-                csv_file_path = os.path.join(output_csv, f"{book_num}.csv")
-                
-                # Write the parsed data to a CSV file
-                try:
-                    with open(csv_file_path, 'w') as csv_file:
-                        writer = csv.writer(csv_file)
-                        for page in pages:
-                            writer.writerow([page['page'], page['title'], *list(set(page['words']))])
-                    print(f'Wrote CSV file {book_num}.csv')
-                except FileNotFoundError:
-                    print(f"[ERROR] Could not find the directory to write the CSV file: {csv_file_path}")
-                except PermissionError:
-                    print(f"[ERROR] Permission denied when trying to write to {csv_file_path}")
-                except Exception as e:
-                    print(f"[ERROR] An error occurred while writing the CSV file: {e}")
+            journal_path = os.path.join(output_csv, f"{book_num}.csv.journal")
+            try:
+                journal = BookJournal(journal_path, source_file, pdf_processor.output_settings(), resume=args.resume)
+                if journal.scans:
+                    print(f'Resuming {source_file}: {len(journal.scans)} pages already done')
+            except OSError as e:
+                print(f"[WARNING] Could not open journal {journal_path}: {e}. Continuing without checkpoints.")
+                journal = None
+            books.append((book_num, source_file, journal))
+
+        # Books are independent until the index is created: with several workers they
+        # share one process pool and each CSV is written as soon as its book finishes
+        if args.workers > 1:
+            print(f'Reading {len(books)} books with {args.workers} workers')
+            results = pdf_processor.read_books(books, args.workers, quiet=len(books) > 1)
+        else:
+            results = read_books_sequentially(pdf_processor, books, args.pipeline)
+
+        journals = {book_num: journal for book_num, _, journal in books}
+        failed = []
+        # With a shared pool books overlap, so their wall time counts from the start of the run
+        run_started = book_started = perf_counter()
+        for book_num, source_file, result in results:
+            book_finished = perf_counter()
+            if isinstance(result, Exception):
+                print(f"[ERROR] An error occurred while reading {source_file}: {result}")
+                failed.append(source_file)
+                continue
+            pages, course_code, course_title, page_count = result
+            print(f'{source_file}: {page_count} pages found')
+            # Once the term store is written the checkpoints are no longer needed. start_page keeps
+            # the store_write timing (and its cProfile data) out of the last page's timings.
+            pdf_processor.timer.start_page()
+            with pdf_processor.timer.stage('store_write'):
+                # The CSV export is written first so that the term store of the same run is the
+                # newer file (see IndexCreator.book_paths)
+                written = True
+                if args.export_csv:
+                    written = write_csv(os.path.join(output_csv, f"{book_num}.csv"), book_num, pages)
+                written = write_store(os.path.join(output_csv, f"{book_num}.terms"), book_num, pages) and written
+                written = write_fulltext(output_csv, book_num, pages) and written
+            if report is not None:
+                report.add_book(book_num, pages, book_finished - book_started)
+                report.add_stage(book_num, 'store_write', perf_counter() - book_finished)
+            if written and journals[book_num] is not None:
+                journals.pop(book_num).remove()
+            if args.workers <= 1:
+                book_started = perf_counter()
+        for journal in journals.values():
+            if journal is not None:
+                journal.close()
+        if failed:
+            print(f"[ERROR] {len(failed)} book(s) failed: {', '.join(failed)}")
+        sources = pdf_processor.title_sources
+        print('Title sources: ' + ', '.join(f'{source} {count}' for source, count in sorted(sources.items())))
+        if title_cache:
+            print(f"Title cache: {sources['cache']} hits, {sources['ocr']} misses")
+        if report is not None:
+            summary = report.write(args.profile, perf_counter() - run_started)
+            print(f"Wrote profile {args.profile}: {summary['pages']} pages, {summary['pages_per_sec']:.2f} pages/sec")
+            if profile_dump:
+                pdf_processor.timer.dump()
+                if merge_profile_dumps(profile_dump):
+                    print(f"Wrote cProfile statistics for stage '{args.profile_stage}' to {profile_dump}")
 
     def create_index(args):
         # Initialize IndexCreator
-        index_creator = IndexCreator(args.course, args.output_pdf, int(args.freq_limit))
+        memory_budget = args.index_memory * 1024 * 1024 if args.index_memory else None
+        index_creator = IndexCreator(args.course, args.output_pdf, int(args.freq_limit), memory_budget=memory_budget, spill_dir=args.spill_dir,
+                                     makeindex=args.makeindex, compare_makeindex=args.compare_makeindex, renderer=args.renderer, rebuild=args.rebuild)
         index_creator.create()
 
     try:
@@ -456,6 +1468,13 @@ def main():
         if args.books and len(args.books) != len(args.source):
             print("[ERROR] The number of books must match the number of source PDF files")
             sys.exit(1)
+        # Validate the pipeline worker counts
+        if args.pipeline and min(args.pipeline) < 0:
+            print("[ERROR] --pipeline worker counts cannot be negative")
+            sys.exit(1)
+        if args.pipeline and args.workers > 1:
+            print("[ERROR] --pipeline reads one book at a time and cannot be combined with -w/--workers above 1")
+            sys.exit(1)
         # Download NLTK data if necessary
         if args.output_pdf:
             try:
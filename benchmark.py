@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Benchmarks the indexer on synthetic course books generated offline with
+#                   PyMuPDF, so performance changes can be evaluated without licensed
+#                   courseware. Each synthetic book has vector title bars inside top_bounds,
+#                   a course banner matching course_pattern and the license footer stripped
+#                   by parse_page. Reading, word dictionary building/filtering, .idx
+#                   generation and the native PDF rendering are timed separately.
+#                   The contour and projection title bar detectors are timed on the same
+#                   renders and must find the same title boxes.
+#
+# BASIC USAGE:      # Run and save the numbers as a baseline
+#                   python3 benchmark.py --books 2 --pages 100 --vocab 3000 --save baseline.json
+#
+#                   # Run again later and compare against the baseline
+#                   python3 benchmark.py --books 2 --pages 100 --vocab 3000 --baseline baseline.json
+#
+#                   # Also compare the title bar detectors on the pages of real books
+#                   python3 benchmark.py --box-pdf book1.pdf book2.pdf
+#
+# ---------------------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import importlib.util
+from time import perf_counter
+import fitz
+
+APP_HOME = os.path.dirname(os.path.realpath(__file__))
+
+COURSE_TITLE = 'SYN501 | Synthetic Security Essentials'
+SYLLABLES = ['ka', 'ro', 'tec', 'lin', 'ux', 'net', 'pro', 'sec', 'dat', 'ver', 'mal', 'cry', 'pto', 'log',
+             'ker', 'ber', 'os', 'ad', 'min', 'hash', 'key', 'shell', 'port', 'scan', 'dns', 'web', 'fire', 'wall']
+FOOTER = ('\n{page}\n© 2024 Synthetic Author\n© SANS Institute 2024\n3f2a9c1b\nstudent@example.com\n48213\n'
+          'Jane Student\nsynthetic\nlive\n'
+          'Licensed To: Jane Student <student@example.com> Jan 5, 2024\n'
+          'Licensed To: Jane Student <student@example.com> Jan 5, 2024\n')
+
+
+# Import 'Indexer v2.py', whose file name is not a valid module name
+def load_indexer():
+    spec = importlib.util.spec_from_file_location('indexer', os.path.join(APP_HOME, 'Indexer v2.py'))
+    module = importlib.util.module_from_spec(spec)
+    # Registered so that process pool workers can unpickle its functions
+    sys.modules['indexer'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Deterministic pseudo-words built from syllables
+def make_vocabulary(size, rng):
+    vocabulary = []
+    seen = set()
+    while len(vocabulary) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+
+# Write a synthetic course book. Every untitled_every-th page has no title bar, like
+# continuation and notes pages in real books.
+def make_book(path, book_num, pages, vocabulary, rng, words_per_page=120, untitled_every=3):
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=792, height=612)
+        words = rng.choices(vocabulary, weights=weights, k=words_per_page)
+        if i % untitled_every != untitled_every - 1:
+            # Dark filled bar inside top_bounds ([320, 550, 250, 2300] at 300 DPI)
+            page.draw_rect(fitz.Rect(72, 85, 500, 122), color=None, fill=(0.12, 0.16, 0.3))
+            title = ' '.join(words[:4]).title()
+            page.insert_text((80, 110), f'Book {book_num}: {title}', fontsize=18, color=(1, 1, 1))
+        body = fitz.Rect(72, 150, 720, 520)
+        page.insert_textbox(body, ' '.join(words) + '.', fontsize=11)
+        page.insert_text((72, 560), COURSE_TITLE, fontsize=8)
+        page.insert_text((560, 530), FOOTER.format(page=i + 1), fontsize=4)
+    doc.save(path)
+    doc.close()
+
+
+# Run fn repeat times and return the fastest wall time and the last result
+def timed(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = fn()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# Compare the contour and projection title bar detectors on every page: the title box on a
+# render of top_bounds at OCR DPI and the bar found by the coarse pass. Returns the time
+# each detector spent on the full renders and the pages where the detectors disagree.
+# test_box_detectors.py runs the same comparison as a test.
+def compare_box_detectors(indexer, paths):
+    processors = {detector: indexer.PDFProcessor(top_bounds=[320, 550, 250, 2300], ocr_dpi=300, stopwords=[], box_detector=detector)
+                  for detector in ('contour', 'projection')}
+    contour, projection = processors['contour'], processors['projection']
+    times = dict.fromkeys(processors, 0)
+    disagreements = []
+    for path in paths:
+        with fitz.open(path) as doc:
+            for page in doc:
+                # Keep the pixmap referenced while its samples are in use
+                pixmap = contour.get_region_pixmap(page, contour.top_bounds)
+                region = indexer.pixmap_to_array(pixmap)
+                boxes = {}
+                for detector, processor in processors.items():
+                    start = perf_counter()
+                    boxes[detector] = processor.find_title_box(region, processor.top_bounds)
+                    times[detector] += perf_counter() - start
+                if boxes['contour'] != boxes['projection']:
+                    disagreements.append(f"{os.path.basename(path)} page {page.number + 1}: {boxes['contour']} != {boxes['projection']}")
+                contour_bar, projection_bar = contour.find_coarse_bar(page), projection.find_coarse_bar(page)
+                if contour_bar != projection_bar:
+                    disagreements.append(f'{os.path.basename(path)} page {page.number + 1} (coarse): {contour_bar} != {projection_bar}')
+    return times['contour'], times['projection'], disagreements
+
+
+# Time every stage of the indexer on the generated books
+def run(args, indexer, paths):
+    metrics = {}
+    processor = indexer.PDFProcessor(top_bounds=[320, 550, 250, 2300], ocr_dpi=300, stopwords=[], title_strategy=args.title_strategy,
+                                     nlp_engine=args.nlp)
+
+    books = []
+    read_total = 0
+    page_total = 0
+    for path in paths:
+        elapsed, result = timed(lambda: processor.read_book(path, quiet=True, workers=args.workers, pipeline=args.pipeline), args.repeat)
+        books.append(result[0])
+        read_total += elapsed
+        page_total += fitz.open(path).page_count
+    metrics['read_book'] = read_total
+    metrics['read_book_pages_per_sec'] = page_total / read_total if read_total else 0
+
+    # The same rows the CSV files would hold
+    rows = [[[page['page'], page['title'] or '', *dict.fromkeys(page['words'])] for page in pages] for pages in books]
+    titles = [[{'page': row[0], 'title': row[1]} for row in book if row[1]] for book in rows]
+    creator = indexer.IndexCreator(COURSE_TITLE.split('|')[0].strip(), 'index.pdf', args.freq_limit)
+
+    def build():
+        word_dictionary = None
+        for i, book in enumerate(rows):
+            word_dictionary = creator.build_word_dictionary(i + 1, book, word_dictionary)
+        return word_dictionary
+    metrics['build_word_dictionary'], word_dictionary = timed(build, args.repeat)
+    metrics['filter_word_dictionary'], filtered = timed(
+        lambda: creator.filter_word_dictionary(word_dictionary, min_count=1, max_count=args.freq_limit), args.repeat)
+
+    idx_path = os.path.join(args.workdir, 'main.idx')
+
+    metrics['idx'], _ = timed(lambda: creator.write_idx(idx_path, titles, filtered), args.repeat)
+    metrics['idx_bytes'] = os.path.getsize(idx_path)
+    metrics['render_native'], _ = timed(lambda: indexer.render_index(idx_path, os.path.join(args.workdir, 'index.pdf')), args.repeat)
+    metrics['terms'] = len(word_dictionary)
+    metrics['indexed_terms'] = len(filtered)
+
+    metrics['boxes_contour'], metrics['boxes_projection'], disagreements = compare_box_detectors(indexer, paths + args.box_pdf)
+    for disagreement in disagreements:
+        print(f'[WARNING] Title box detectors disagree on {disagreement}')
+    metrics['box_disagreements'] = len(disagreements)
+    return metrics
+
+
+# Print the metrics, with the ratio to a baseline when one is given
+def report(metrics, baseline, tolerance):
+    regressions = []
+    for name, value in metrics.items():
+        line = f'{name:28} {value:14.4f}'
+        if baseline and name in baseline and baseline[name]:
+            ratio = value / baseline[name]
+            line += f'   {ratio:6.2f}x baseline'
+            # Throughput regresses when it drops, everything else when it grows
+            worse = ratio < 1 - tolerance if name.endswith('_per_sec') else ratio > 1 + tolerance
+            if worse and not name.endswith(('_bytes', 'terms', '_disagreements')):
+                line += '   REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, help='Number of synthetic books', default=2)
+    parser.add_argument('--pages', type=int, help='Pages per book', default=60)
+    parser.add_argument('--vocab', type=int, help='Vocabulary size', default=2000)
+    parser.add_argument('--seed', type=int, help='Random seed for the synthetic books', default=1)
+    parser.add_argument('--repeat', type=int, help='Runs per measurement (the fastest is kept)', default=3)
+    parser.add_argument('-w', '--workers', type=int, help='Worker processes for read_book', default=1)
+    parser.add_argument('-f', '--freq_limit', type=int, help='Limit for occurrences of words', default=10)
+    parser.add_argument('--pipeline', nargs=2, type=int, metavar=('OCR', 'NLP'), help='Read through the staged pipeline with this many OCR threads and NLP processes')
+    parser.add_argument('--title-strategy', choices=['auto', 'ocr'], help='Title strategy for read_book', default='auto')
+    parser.add_argument('--nlp', choices=['textblob', 'fast'], help='Term extraction engine for read_book', default='textblob')
+    parser.add_argument('--keep', help='Keep the generated books in this directory')
+    parser.add_argument('--baseline', help='Compare against metrics saved with --save')
+    parser.add_argument('--tolerance', type=float, help='Allowed slowdown before a metric is flagged', default=0.1)
+    parser.add_argument('--save', help='Save the metrics as a baseline JSON file')
+    parser.add_argument('--box-pdf', nargs='+', help='More PDF files to compare the title bar detectors on', default=[])
+    args = parser.parse_args()
+
+    args.workdir = args.keep or tempfile.mkdtemp(prefix='indexer-bench-')
+    os.makedirs(args.workdir, exist_ok=True)
+    try:
+        rng = random.Random(args.seed)
+        vocabulary = make_vocabulary(args.vocab, rng)
+        paths = []
+        for book_num in range(1, args.books + 1):
+            path = os.path.join(args.workdir, f'book{book_num}.pdf')
+            make_book(path, book_num, args.pages, vocabulary, rng)
+            paths.append(path)
+        print(f'Generated {args.books} books of {args.pages} pages in {args.workdir}')
+
+        metrics = run(args, load_indexer(), paths)
+        config = {key: getattr(args, key) for key in ['books', 'pages', 'vocab', 'seed', 'workers', 'pipeline', 'freq_limit', 'title_strategy', 'nlp']}
+
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                saved = json.load(f)
+            if saved['config'] != config:
+                print(f'[WARNING] Baseline was recorded with a different configuration: {saved["config"]}')
+            baseline = saved['metrics']
+        regressions = report(metrics, baseline, args.tolerance)
+
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump({'config': config, 'metrics': metrics}, f, indent=2)
+            print(f'Saved baseline to {args.save}')
+        if metrics['box_disagreements']:
+            regressions.append('box_disagreements')
+        if regressions:
+            print(f'[ERROR] Regressions: {", ".join(regressions)}')
+            sys.exit(1)
+    finally:
+        if not args.keep:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
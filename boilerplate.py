@@ -0,0 +1,54 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Learned boilerplate removal. Lines that repeat on a large share of a
+#                   book's pages (license footer, course banner, copyright lines) are learned
+#                   in one pass over the book and stripped from every page in linear time.
+#                   The page number is the number line that introduces the longest run of
+#                   boilerplate lines, i.e. the line right above the license footer.
+#
+# ---------------------------------------------------------------------------------------------
+
+from collections import Counter
+
+
+class Boilerplate:
+    def __init__(self, lines):
+        self.lines = frozenset(lines)
+
+    # Learn the lines found on at least min_share of the pages (and on at least min_pages pages)
+    @classmethod
+    def learn(cls, texts, min_share=0.5, min_pages=3):
+        counts = Counter()
+        pages = 0
+        for text in texts:
+            counts.update({line.strip() for line in text.split('\n')} - {''})
+            pages += 1
+        threshold = max(min_pages, min_share * pages)
+        return cls(line for line, count in counts.items() if count >= threshold)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    # Remove boilerplate lines from a page; returns the remaining text and the page number
+    def strip(self, text):
+        lines = text.split('\n')
+        kept = []
+        number_at = None
+        best_run = 0
+        i = 0
+        while i < len(lines):
+            if lines[i].strip() not in self.lines:
+                kept.append(i)
+                i += 1
+                continue
+            # A run of boilerplate lines; a number line right above it may be the page number
+            start = i
+            while i < len(lines) and (lines[i].strip() in self.lines or not lines[i].strip()):
+                i += 1
+            if kept and kept[-1] == start - 1 and lines[start - 1].strip().isdigit() and i - start > best_run:
+                best_run = i - start
+                number_at = len(kept) - 1
+        page_number = ''
+        if number_at is not None:
+            page_number = lines[kept.pop(number_at)].strip()
+        return '\n'.join(lines[n] for n in kept), page_number
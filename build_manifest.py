@@ -0,0 +1,60 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Build manifest of a course directory. Every stage of the index build
+#                   (main.idx, main.ind, the PDF) records the fingerprint of its inputs: the
+#                   content hashes of its input files, its parameters and the fingerprint of
+#                   the stage before it. A stage whose fingerprint matches the last build and
+#                   whose outputs still exist is skipped, so re-running an unchanged course
+#                   costs one hash per input file.
+#
+# ---------------------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+from journal import file_hash
+
+MANIFEST_VERSION = 1
+
+
+# Fingerprint of a stage: its input files (by name and content; missing files count as
+# absent), its parameters and the fingerprint of the stage it is built from
+def fingerprint(files=(), params=None, parent=None):
+    inputs = {
+        'files': [[os.path.basename(path), file_hash(path) if os.path.exists(path) else None] for path in files],
+        'params': params,
+        'parent': parent,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+class BuildManifest:
+    # Load the manifest at path; a missing or unreadable manifest has no stages
+    def __init__(self, path):
+        self.path = path
+        self.stages = {}
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+            if manifest.get('manifest') == MANIFEST_VERSION:
+                self.stages = manifest['stages']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, AttributeError):
+            print(f"[WARNING] Build manifest {path} is unreadable. Rebuilding all stages.")
+
+    # True when the stage was last built from the same inputs and its outputs still exist
+    def is_current(self, stage, key, outputs=()):
+        return self.stages.get(stage) == key and all(os.path.exists(path) for path in outputs)
+
+    # Record a finished stage
+    def record(self, stage, key):
+        self.stages[stage] = key
+        self.save()
+
+    # Written to a temporary file first so that an interrupted write never leaves a broken manifest
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'manifest': MANIFEST_VERSION, 'stages': self.stages}, f, indent=2)
+        os.replace(tmp_path, self.path)
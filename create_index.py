@@ -1,57 +1,27 @@
 import os
 import sys
 import csv
+from inverted_index import InvertedIndex
+from build_manifest import BuildManifest, fingerprint
 
 # Usage: python3 create_index.py CODE
 
 MAX_PAGES = 10
 
-def make_big_dic(book, pages, bd=None):
-    big_dic = {}
+# Terms that shrink_that_massive_dic(max_cnt=max_cnt, max_len=max_len) would remove are
+# dropped as soon as they qualify
+def make_big_dic(book, pages, bd=None, max_cnt=None, max_len=None):
+    big_dic = InvertedIndex(max_count=max_cnt, max_length=max_len, drop_spaces=True)
     if bd is not None:
         big_dic = bd
-    for p in pages:
-        for w in p[2:]:
-            if w == p[0]:
-                continue
-            if w not in big_dic:
-                big_dic[w] = {
-                    'cnt': 1,
-                    'books': {
-                        book: {
-                            p[0]: 1
-                        }
-                    }
-                }
-                continue
-            big_dic[w]['cnt'] += 1
-            if book not in big_dic[w]['books']:
-                big_dic[w]['books'][book] = {
-                    p[0]: 1
-                }
-                continue
-            if p[0] not in big_dic[w]['books'][book]:
-                big_dic[w]['books'][book][p[0]] = 1
-            else:
-                big_dic[w]['books'][book][p[0]] += 1
+    big_dic.add_pages(book, pages)
     return big_dic
 
 def shrink_that_massive_dic(big_dic, min_cnt=1, max_cnt=10, max_len=30):
-    res = {}
-    for w in big_dic:
-        if ' ' in w:
-            continue
-        if big_dic[w]['cnt'] < min_cnt:
-            continue
-        if len(w) > max_len:
-            continue
-        pg_cnt = sum([len(big_dic[w]['books'][b]) for b in big_dic[w]['books']])
-        if pg_cnt < max_cnt:
-            res[w] = big_dic[w]
-    return res
+    return big_dic.filter(min_count=min_cnt, max_count=max_cnt, max_length=max_len)
 
-def read_all_csvs(course_path):
-    big_dic = {}
+def read_all_csvs(course_path, max_cnt=None, max_len=None):
+    big_dic = InvertedIndex(max_count=max_cnt, max_length=max_len, drop_spaces=True)
     titles = []
     i = 1
     while os.path.exists(os.path.join(course_path, f'{i}.csv')):
@@ -76,10 +46,8 @@ def make_title_entries(titles):
 
 def make_index_entries(big_dic):
     res = []
-    for w in big_dic:
-        for b in big_dic[w]['books']:
-            for p in big_dic[w]['books'][b]:
-                res.append('\indexentry{' + w.replace('_','\_').replace('"','\\"') + '|book{' + str(b) + '}}{' + str(p) + '}')
+    for w, b, p in big_dic.entries():
+        res.append('\indexentry{' + w.replace('_','\_').replace('"','\\"') + '|book{' + str(b) + '}}{' + str(p) + '}')
     return res
 
 def main():
@@ -99,25 +67,51 @@ def main():
         print('Course does not exist')
         sys.exit(1)
     
-    # Read all CSVs
-    titles, books = read_all_csvs(course_path)
-    print(f'Found {len(books)} books')
+    max_cnt = 20
+    cwd = os.getcwd()
+    pdf_path = os.path.join(cwd, course_code + '-index.pdf')
 
-    # Filter out words that appear in more than 10 pages
-    books = shrink_that_massive_dic(books, min_cnt=1, max_cnt=20)
+    # Skip the stages whose inputs are unchanged since the last build
+    manifest = BuildManifest(os.path.join(course_path, 'build.json'))
+    csv_paths = []
+    i = 1
+    while os.path.exists(os.path.join(course_path, f'{i}.csv')):
+        csv_paths.append(os.path.join(course_path, f'{i}.csv'))
+        i += 1
+    idx_key = fingerprint(csv_paths, {'min_count': 1, 'max_count': max_cnt, 'max_length': 30, 'ranges': False})
+    pdf_key = fingerprint([os.path.join(app_home, 'resources', 'std.ist'), os.path.join(app_home, 'resources', 'main.tex')],
+                          {'renderer': 'latex', 'output': pdf_path}, idx_key)
+    table_path = os.path.join(course_path, 'terms.table')
+    if manifest.is_current('pdf', pdf_key, [pdf_path, table_path]):
+        print(f'{pdf_path} is up to date')
+        return
 
-    # Generate title entries
-    title_entries = make_title_entries(titles)
+    if manifest.is_current('idx', idx_key, [os.path.join(course_path, 'main.idx'), table_path]):
+        print('main.idx is up to date')
+    else:
+        # Read all CSVs, dropping words that appear on 20 or more pages as they are read
+        titles, books = read_all_csvs(course_path, max_cnt=max_cnt, max_len=30)
+        print(f'Found {len(books)} books')
 
-    # Generate index entries
-    index_entries = make_index_entries(books)
+        # Filter out words that appear in more than 10 pages
+        selection = shrink_that_massive_dic(books, min_cnt=1, max_cnt=max_cnt)
+
+        # Keep the term table of the indexed terms for sans_search
+        books.write_term_table(table_path, selection.term_ids)
+        books = selection
+
+        # Generate title entries
+        title_entries = make_title_entries(titles)
+
+        # Generate index entries
+        index_entries = make_index_entries(books)
+
+        # Write to file
+        res = '\n'.join(title_entries) + '\n' + '\n'.join(index_entries)
+        with open(os.path.join(course_path,'main.idx'),'w') as idx_file:
+            idx_file.write(res)
+        manifest.record('idx', idx_key)
 
-    # Write to file
-    res = '\n'.join(title_entries) + '\n' + '\n'.join(index_entries)
-    with open(os.path.join(course_path,'main.idx'),'w') as idx_file:
-        idx_file.write(res)
-        
-    cwd = os.getcwd()
     os.chdir(course_path)
     os.system('makeindex main.idx -s ' + os.path.join(app_home,'resources','std.ist'))
     os.system('cp ' + os.path.join(app_home,'resources','main.tex') + ' main.tex')
@@ -125,7 +119,8 @@ def main():
     for f in ['main.aux','main.log','main.ilg','main.tex','main.ind','main.synctex.gz']:
         os.remove(f)
     os.chdir(cwd)
-    os.rename(os.path.join(course_path,'main.pdf'), os.path.join(cwd,course_code + '-index.pdf'))
+    os.rename(os.path.join(course_path,'main.pdf'), pdf_path)
+    manifest.record('pdf', pdf_key)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
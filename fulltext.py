@@ -0,0 +1,264 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Full-text search over the raw page text of the books. When a book is
+#                   extracted its pages (page number, title, raw text) are written to a page
+#                   store with an offset table, and its words to a positional index: the pages
+#                   and word positions of every word of the book. Books are indexed one at a
+#                   time; a query reads the indexes of all books of a course and ranks the
+#                   pages with BM25, with quoted phrases matched on consecutive positions.
+#                   Only the standard library is used, so search.py starts quickly.
+#
+#                   Page store layout (native byte order, see byteorder in the header):
+#                     header    magic, version, byteorder, page count
+#                     offsets   uint64[pages * 3 + 1]   offsets of page number, title and text
+#                     blob      UTF-8 strings
+#
+#                   Positional index layout:
+#                     header            magic, version, byteorder, term/page/posting/position
+#                                       counts and the total number of words
+#                     term offsets      uint32[terms + 1]       offsets into the term blob
+#                     posting offsets   uint32[terms + 1]       first posting of each term
+#                     posting pages     uint32[postings]        page of each posting
+#                     position offsets  uint32[postings + 1]    first position of each posting
+#                     positions         uint32[positions]       word positions on the page
+#                     page lengths      uint32[pages]           words per page
+#                     term blob         UTF-8 terms, sorted
+#
+# ---------------------------------------------------------------------------------------------
+
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from term_table import SortedKeys
+
+PAGE_MAGIC = b'SANSPAGE'
+PAGE_HEADER = struct.Struct('<8sIII')
+INDEX_MAGIC = b'SANSFTXT'
+INDEX_HEADER = struct.Struct('<8sIIIIIIQ')
+FULLTEXT_VERSION = 1
+BYTEORDERS = {'little': 0, 'big': 1}
+TOKEN_PATTERN = re.compile(r'\w+')
+# Quoted phrases and single words of a query
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+# Lowercase words of a text
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# Write arrays and a blob after a header, through a temporary file
+def write_sections(path, header, sections, blob):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for values in sections:
+            values.tofile(f)
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+# Write the pages of a book (page, title, raw) to a page store
+def write_page_store(path, pages):
+    blob = bytearray()
+    offsets = array('Q', [0])
+    for page in pages:
+        for string in (str(page['page']), page['title'] or '', page.get('raw') or ''):
+            blob += string.encode('utf-8')
+            offsets.append(len(blob))
+    write_sections(path, PAGE_HEADER.pack(PAGE_MAGIC, FULLTEXT_VERSION, BYTEORDERS[sys.byteorder], len(pages)), [offsets], blob)
+
+
+# Write the positional index of the raw text of the pages of a book
+def write_fulltext_index(path, pages):
+    # (page, position) pairs of every word, in page and position order
+    occurrences = {}
+    lengths = array('I')
+    for page, element in enumerate(pages):
+        tokens = tokenize(element.get('raw') or '')
+        lengths.append(len(tokens))
+        for position, token in enumerate(tokens):
+            pairs = occurrences.get(token)
+            if pairs is None:
+                pairs = occurrences[token] = array('I')
+            pairs.append(page)
+            pairs.append(position)
+
+    terms = sorted(occurrences, key=lambda term: term.encode('utf-8'))
+    term_blob = bytearray()
+    term_offsets = array('I', [0])
+    posting_offsets = array('I', [0])
+    posting_pages = array('I')
+    position_offsets = array('I', [0])
+    positions = array('I')
+    for term in terms:
+        term_blob += term.encode('utf-8')
+        term_offsets.append(len(term_blob))
+        pairs = occurrences[term]
+        start = len(positions)
+        positions.extend(pairs[1::2])
+        # One posting per run of pairs on the same page
+        last_page = None
+        for i, page in enumerate(pairs[0::2]):
+            if page != last_page:
+                if last_page is not None:
+                    position_offsets.append(start + i)
+                posting_pages.append(page)
+                last_page = page
+        position_offsets.append(len(positions))
+        posting_offsets.append(len(posting_pages))
+    header = INDEX_HEADER.pack(INDEX_MAGIC, FULLTEXT_VERSION, BYTEORDERS[sys.byteorder], len(terms), len(lengths),
+                               len(posting_pages), len(positions), sum(lengths))
+    write_sections(path, header, [term_offsets, posting_offsets, posting_pages, position_offsets, positions, lengths], term_blob)
+
+
+# Base of the memory-mapped page store and positional index
+class MappedFile:
+    def __init__(self, path, header, magic):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < header.size:
+                raise ValueError(f'{path} is truncated')
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = header.unpack_from(self.map)
+        if fields[0] != magic:
+            raise ValueError(f'{path} is not a {magic.decode()} file')
+        if fields[1] != FULLTEXT_VERSION:
+            raise ValueError(f'{path} has version {fields[1]}, expected {FULLTEXT_VERSION}')
+        if fields[2] != BYTEORDERS[sys.byteorder]:
+            raise ValueError(f'{path} was written on a machine with a different byte order')
+        self.fields = fields[3:]
+        self.view = memoryview(self.map)
+        self.sections = []
+        self.start = header.size
+
+    # An array of count items of the given type code at the current offset
+    def section(self, count, code='I'):
+        end = self.start + count * struct.calcsize(code)
+        if end > len(self.view):
+            raise ValueError(f'{self.path} is truncated')
+        values = self.view[self.start:end].cast(code)
+        self.sections.append(values)
+        self.start = end
+        return values
+
+    def close(self):
+        for values in self.sections:
+            values.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PageStore(MappedFile):
+    def __init__(self, path):
+        super().__init__(path, PAGE_HEADER, PAGE_MAGIC)
+        self.page_count, = self.fields
+        self.offsets = self.section(self.page_count * 3 + 1, 'Q')
+        self.blob = self.view[self.start:]
+        self.sections.append(self.blob)
+
+    def string(self, index):
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    # Page number, title and raw text of a page
+    def page(self, page):
+        return self.string(page * 3), self.string(page * 3 + 1), self.string(page * 3 + 2)
+
+
+class FullTextIndex(MappedFile):
+    def __init__(self, path):
+        super().__init__(path, INDEX_HEADER, INDEX_MAGIC)
+        self.term_count, self.page_count, posting_count, position_count, self.total_length = self.fields
+        self.term_offsets = self.section(self.term_count + 1)
+        self.posting_offsets = self.section(self.term_count + 1)
+        self.posting_pages = self.section(posting_count)
+        self.position_offsets = self.section(posting_count + 1)
+        self.positions = self.section(position_count)
+        self.page_lengths = self.section(self.page_count)
+        self.term_blob = self.view[self.start:]
+        self.sections.append(self.term_blob)
+        self.keys = SortedKeys(self.term_count, lambda position: bytes(self.term_blob[self.term_offsets[position]:self.term_offsets[position + 1]]))
+
+    # Postings of a word as {page: positions}
+    def postings(self, term):
+        term = term.encode('utf-8')
+        position = bisect_left(self.keys, term)
+        if position == self.term_count or self.keys[position] != term:
+            return {}
+        postings = {}
+        for posting in range(self.posting_offsets[position], self.posting_offsets[position + 1]):
+            postings[self.posting_pages[posting]] = self.positions[self.position_offsets[posting]:self.position_offsets[posting + 1]].tolist()
+        return postings
+
+
+# Parse a query into clauses, each a list of words: a quoted phrase or a single word
+def parse_query(query):
+    clauses = []
+    for phrase, word in QUERY_PATTERN.findall(query):
+        words = tokenize(phrase if phrase else word)
+        if phrase and words:
+            clauses.append(words)
+        else:
+            clauses.extend([word] for word in words)
+    return clauses
+
+
+# Frequency of a clause on every page it occurs on, as {page: count}
+def clause_frequencies(index, words):
+    postings = [index.postings(word) for word in words]
+    if len(words) == 1:
+        return {page: len(positions) for page, positions in postings[0].items()}
+    frequencies = {}
+    pages = set(postings[0]).intersection(*postings[1:])
+    for page in pages:
+        following = [set(word_postings[page]) for word_postings in postings[1:]]
+        count = sum(1 for start in postings[0][page] if all(start + i + 1 in positions for i, positions in enumerate(following)))
+        if count:
+            frequencies[page] = count
+    return frequencies
+
+
+# Rank the pages of the books [(book, FullTextIndex)] for a query with BM25; returns
+# [(score, book, page)] best first
+def rank(books, query, limit=20):
+    clauses = parse_query(query)
+    page_count = sum(index.page_count for _, index in books)
+    if not clauses or not page_count:
+        return []
+    average_length = max(sum(index.total_length for _, index in books) / page_count, 1)
+    scores = {}
+    for words in clauses:
+        frequencies = [(book, index, clause_frequencies(index, words)) for book, index in books]
+        df = sum(len(pages) for _, _, pages in frequencies)
+        if not df:
+            continue
+        idf = math.log(1 + (page_count - df + 0.5) / (df + 0.5))
+        for book, index, pages in frequencies:
+            for page, tf in pages.items():
+                norm = K1 * (1 - B + B * index.page_lengths[page] / average_length)
+                scores[(book, page)] = scores.get((book, page), 0) + idf * tf * (K1 + 1) / (tf + norm)
+    ranked = sorted(((score, book, page) for (book, page), score in scores.items()), key=lambda hit: (-hit[0], hit[1], hit[2]))
+    return ranked[:limit]
+
+
+# First line of a text containing one of the words
+def snippet(text, words, width=100):
+    for line in text.split('\n'):
+        tokens = set(tokenize(line))
+        if any(word in tokens for word in words):
+            return line.strip()[:width]
+    return ''
@@ -0,0 +1,192 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Renders the sorted index straight to a multi-column PDF with PyMuPDF,
+#                   without a LaTeX run. The entries of main.idx are sorted with the native
+#                   makeindex (makeindex.py) and laid out like the LaTeX index: book sections
+#                   with their page titles, then the terms, each with its page list where
+#                   \book{n}{pages} references get a bold book label.
+#
+# ---------------------------------------------------------------------------------------------
+
+import re
+import fitz
+from makeindex import read_style, read_idx, sort_entries, IndexItems
+
+# Letter paper in points
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 36
+COLUMN_GAP = 14
+# Indent per level and of wrapped lines
+LEVEL_INDENT = 9
+HANG_INDENT = 12
+# LaTeX the index keys may contain: \textbf{...} and escaped characters
+BOLD_PATTERN = re.compile(r'\\textbf\{((?:[^{}]|\{[^{}]*\})*)\}')
+ESCAPE_PATTERN = re.compile(r'\\([_&%$#{}"\\])')
+BOOK_ENCAP = re.compile(r'book\{(\w+)\}')
+# Text is written with the standard Helvetica fonts, which use the WinAnsi (cp1252) encoding
+FONT_NAMES = {False: 'helv', True: 'hebo'}
+ENCODING = 'cp1252'
+
+
+# LaTeX text without escapes, with characters the fonts cannot encode replaced by '?'
+def plain_text(text):
+    return ESCAPE_PATTERN.sub(r'\1', text).encode(ENCODING, 'replace').decode(ENCODING)
+
+
+# Plain text of a LaTeX key as (text, bold) runs
+def latex_runs(text):
+    runs = []
+    end = 0
+    for match in BOLD_PATTERN.finditer(text):
+        if match.start() > end:
+            runs.append((plain_text(text[end:match.start()]), False))
+        runs.append((plain_text(match.group(1)), True))
+        end = match.end()
+    if end < len(text):
+        runs.append((plain_text(text[end:]), False))
+    return runs
+
+
+class IndexRenderer:
+    def __init__(self, columns=3, fontsize=7.5, title=None):
+        self.columns = columns
+        self.fontsize = fontsize
+        self.leading = fontsize * 1.25
+        self.title = title
+        self.fonts = {False: fitz.Font('helv'), True: fitz.Font('hebo')}
+        self.advances = {False: {}, True: {}}
+        self.column_width = (PAGE_WIDTH - 2 * MARGIN - (columns - 1) * COLUMN_GAP) / columns
+        self.doc = fitz.open()
+        self.page = None
+        self.ops = []
+        self.column = 0
+        self.top = MARGIN
+        self.y = 0
+
+    # Width of text in points, from glyph advances cached per character
+    def width(self, text, bold):
+        advances = self.advances[bold]
+        total = 0
+        for char in text:
+            advance = advances.get(char)
+            if advance is None:
+                advance = advances[char] = self.fonts[bold].glyph_advance(ord(char))
+            total += advance
+        return total * self.fontsize
+
+    # Text operators for a string at (x, y), measured from the top left of the page
+    def show(self, x, y, text, bold, fontsize):
+        text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        self.ops.append(f'BT /{FONT_NAMES[bold]} {fontsize:g} Tf {x:.2f} {PAGE_HEIGHT - y:.2f} Td ({text}) Tj ET')
+
+    def new_page(self):
+        self.finish_page()
+        self.page = self.doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        for name in FONT_NAMES.values():
+            self.page.insert_font(fontname=name)
+        self.column = 0
+        # Columns start below the title on the first page
+        self.top = MARGIN
+        if self.title and self.doc.page_count == 1:
+            self.show(MARGIN, MARGIN + 12, plain_text(self.title), True, 14)
+            self.top += 24
+        self.y = self.top
+
+    # Write the collected text of the page as its content stream
+    def finish_page(self):
+        if self.page is None:
+            return
+        xref = self.doc.get_new_xref()
+        self.doc.update_object(xref, '<<>>')
+        self.doc.update_stream(xref, '\n'.join(self.ops).encode(ENCODING))
+        self.page.set_contents(xref)
+        self.ops = []
+
+    # Move down by height, continuing in the next column or page when the column is full
+    def advance(self, height):
+        if self.page is None:
+            self.new_page()
+        self.y += height
+        if self.y > PAGE_HEIGHT - MARGIN:
+            self.column += 1
+            if self.column == self.columns:
+                self.new_page()
+            else:
+                self.y = self.top
+            self.y += height
+
+    # Write one line of (text, bold) runs at indent; neighbouring runs in the same font are
+    # written as one string
+    def put_line(self, runs, indent):
+        self.advance(self.leading)
+        x = MARGIN + self.column * (self.column_width + COLUMN_GAP) + indent
+        merged = []
+        for text, bold in runs:
+            if merged and merged[-1][1] == bold:
+                merged[-1] = (merged[-1][0] + text, bold)
+            else:
+                merged.append((text, bold))
+        for text, bold in merged:
+            self.show(x, self.y, text, bold, self.fontsize)
+            x += self.width(text, bold)
+
+    # Words of the key, then the page references, wrapped to the column width
+    def put_item(self, level, text, pages, delim_r):
+        tokens = []
+        for run, bold in latex_runs(text):
+            tokens.extend([(word, bold)] for word in run.split())
+        for encap, page in pages:
+            page = page.replace(delim_r, '\u2013')
+            book = BOOK_ENCAP.fullmatch(encap)
+            token = [(book.group(1) + ':', True), (page, False)] if book else [(page, bool(encap))]
+            if tokens:
+                tokens[-1] = tokens[-1] + [(',', False)]
+            tokens.append(token)
+        indent = level * LEVEL_INDENT
+        line = []
+        width = 0
+        space = self.width(' ', False)
+        for token in tokens:
+            token_width = sum(self.width(t, bold) for t, bold in token)
+            if line and width + space + token_width > self.column_width - indent:
+                self.put_line(line, indent)
+                indent = level * LEVEL_INDENT + HANG_INDENT
+                line = []
+                width = 0
+            if line:
+                line.append((' ', False))
+                width += space
+            line.extend(token)
+            width += token_width
+        if line:
+            self.put_line(line, indent)
+
+    # Lay out the items of the sorted index
+    def render(self, items, delim_r):
+        for event in items:
+            if event[0] == 'group':
+                if self.page is not None:
+                    self.advance(self.leading * 0.6)
+                continue
+            _, _, level, text, pages = event
+            self.put_item(level, text, pages, delim_r)
+        if self.page is None:
+            self.new_page()
+        self.finish_page()
+
+    def save(self, path):
+        self.doc.save(path, garbage=3, deflate=True)
+        self.doc.close()
+
+
+# Sort the entries of an .idx file and render them to a PDF; returns the rejected lines and
+# the warnings
+def render_index(idx_path, pdf_path, style_path=None, title=None, columns=3):
+    style = read_style(style_path)
+    with open(idx_path) as f:
+        entries, rejected = read_idx(f, style)
+    items = IndexItems(style)
+    renderer = IndexRenderer(columns=columns, title=title)
+    renderer.render(items.items(sort_entries(entries)), style['delim_r'])
+    renderer.save(pdf_path)
+    return rejected, items.warnings
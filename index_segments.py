@@ -0,0 +1,67 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Persisted per-book segments of the course index. A segment holds the
+#                   frozen inverted index of one book (terms, tombstones, pages and postings)
+#                   and the page titles of the book, so when one book is re-extracted only its
+#                   segment is rebuilt and the course index is combined from the segments
+#                   (InvertedIndex.combine) without reading the other books again.
+#
+#                   A segment is an uncompressed .npz file; strings are stored as one UTF-8
+#                   blob with byte offsets.
+#
+# ---------------------------------------------------------------------------------------------
+
+import os
+import numpy as np
+from inverted_index import InvertedIndex
+
+SEGMENT_VERSION = 1
+
+
+# UTF-8 blob and byte offsets of a list of strings
+def pack_strings(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def unpack_strings(blob, offsets):
+    data = blob.tobytes()
+    offsets = offsets.tolist()
+    return [data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+# Write the index of one book and its titles [(page, title)] to a segment file
+def write_segment(path, index, titles):
+    index.freeze()
+    arrays = {}
+    for name, strings in (('terms', index.terms), ('pages', index.page_numbers),
+                          ('title_pages', [page for page, _ in titles]), ('titles', [title for _, title in titles])):
+        arrays[name], arrays[name + '_offsets'] = pack_strings(strings)
+    limits = [-1 if index.max_count is None else index.max_count, -1 if index.max_length is None else index.max_length, int(index.drop_spaces)]
+    # Written to a temporary file first so that a failed write never leaves a truncated segment
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, version=np.array([SEGMENT_VERSION]), limits=np.array(limits, dtype=np.int64),
+                 dropped=np.frombuffer(bytes(index.dropped), dtype=np.uint8), posting_terms=np.asarray(index.posting_terms),
+                 posting_pages=np.asarray(index.posting_pages), posting_tf=np.asarray(index.posting_tf),
+                 term_count=np.asarray(index.term_count), **arrays)
+    os.replace(tmp_path, path)
+
+
+# Read a segment as the index of the given book and its titles [(page, title)]
+def read_segment(path, book):
+    with np.load(path, allow_pickle=False) as segment:
+        if segment['version'][0] != SEGMENT_VERSION:
+            raise ValueError(f"{path} has segment version {segment['version'][0]}, expected {SEGMENT_VERSION}")
+        max_count, max_length, drop_spaces = segment['limits'].tolist()
+        terms = unpack_strings(segment['terms'], segment['terms_offsets'])
+        pages = unpack_strings(segment['pages'], segment['pages_offsets'])
+        titles = list(zip(unpack_strings(segment['title_pages'], segment['title_pages_offsets']),
+                          unpack_strings(segment['titles'], segment['titles_offsets'])))
+        index = InvertedIndex.frozen(terms, [book] * len(pages), pages, segment['dropped'],
+                                     (segment['posting_terms'], segment['posting_pages'], segment['posting_tf']), segment['term_count'],
+                                     max_count=None if max_count < 0 else max_count, max_length=None if max_length < 0 else max_length,
+                                     drop_spaces=bool(drop_spaces))
+    return index, titles
@@ -27,13 +27,30 @@ if [ -f "/usr/bin/sans_unc_pdf" ]; then
     UNINSTALL=1
 fi
 
+if [ -f "/usr/bin/sans_search" ]; then
+    unlink /usr/bin/sans_search
+    UNINSTALL=1
+fi
+
 if [ $UNINSTALL -eq 1 ]; then
     echo "Uninstalled"
     exit 0
 fi
 
-apt install -y tesseract-ocr makeindex pdflatex
-pip install -f requirements.txt
+# libtesseract-dev, libleptonica-dev and pkg-config are needed to build tesserocr
+apt install -y tesseract-ocr libtesseract-dev libleptonica-dev pkg-config makeindex pdflatex
+
+# Create and source env
+if [ ! -d "$APP_HOME/.venv" ]; then
+    python3 -m venv $APP_HOME/.venv
+fi
+. $APP_HOME/.venv/bin/activate
+pip install -r $APP_HOME/requirements.txt
+
+# tesserocr is optional, --ocr auto falls back to pytesseract without it
+if ! pip install -r $APP_HOME/requirements-ocr.txt; then
+    echo "[WARNING] Unable to install tesserocr, titles will be read with pytesseract"
+fi
 
 ln -s $APP_HOME/env_exec.sh /usr/bin/sans_pdf_to_csv
 if [ ! -f "/usr/bin/sans_pdf_to_csv" ]; then
@@ -47,6 +64,12 @@ if [ ! -f "/usr/bin/sans_create_index" ]; then
     exit 0
 fi
 
+ln -s $APP_HOME/env_exec.sh /usr/bin/sans_search
+if [ ! -f "/usr/bin/sans_search" ]; then
+    echo "Unable to install"
+    exit 0
+fi
+
 ln -s $APP_HOME/env_exec.sh /usr/bin/sans_unc_pdf
 
 if [ ! -f "/usr/bin/sans_unc_pdf" ]; then
@@ -57,8 +80,6 @@ fi
 # Get app home from symlink
 # APP_HOME=$(dirname $(readlink -f $0))
 
-# Source env
-. $APP_HOME/.venv/bin/activate
 python -c "import nltk; nltk.download('punkt', download_dir='$APP_HOME/nltk_data'); nltk.download('brown', download_dir='$APP_HOME/nltk_data')"
 
 echo "Installed"
\ No newline at end of file
@@ -0,0 +1,453 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Array-backed inverted index of the words of all books. Terms and pages
+#                   (book, page number) are interned to integer ids and every occurrence is
+#                   appended to two uint32 arrays. On first use the occurrences are merged with
+#                   NumPy into postings of (term, page, tf) sorted by term, with the count and
+#                   document frequency (number of pages) of every term precomputed, so
+#                   filtering the index is a vectorized mask over the terms.
+#
+#                   With pruning limits the index drops a term as soon as it can no longer pass
+#                   the filter: terms with a space or longer than max_length on first sight, and
+#                   terms once they are seen on max_count pages. A dropped term keeps only a
+#                   tombstone and its recorded occurrences are compacted away.
+#
+#                   With a memory budget the index is built in SPIMI style: once the buffered
+#                   occurrences reach the budget they are merged into a run of postings sorted
+#                   by term and spilled to a temporary file. The runs are merged range by range
+#                   of term ids into one postings file that is memory-mapped, so the result is
+#                   the same as the in-memory build. Only the term table stays in memory.
+#
+# ---------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import weakref
+from array import array
+import sys
+import numpy as np
+from term_table import HEADER, MAGIC, TABLE_VERSION, BYTEORDERS
+
+# Bytes per buffered occurrence (term id and page id)
+OCCURRENCE_BYTES = 8
+# Bytes per posting while runs are merged (run columns, sort keys and output)
+MERGE_BYTES = 64
+# Columns of a spilled run and of the merged postings file
+RUN_COLUMNS = [('term', np.uint32), ('page', np.uint32), ('tf', np.uint32), ('first', np.uint64)]
+POSTING_COLUMNS = RUN_COLUMNS[:3]
+
+
+class InvertedIndex:
+    __slots__ = ('term_ids', 'terms', 'page_ids', 'page_books', 'page_numbers', 'occurrence_terms', 'occurrence_pages',
+                 'posting_terms', 'posting_pages', 'posting_tf', 'term_start', 'term_count', 'term_df', 'term_length',
+                 'term_spaces', 'max_count', 'max_length', 'drop_spaces', 'seen_pages', 'last_page', 'dropped', 'fresh_page',
+                 'spill_at', 'spill_dir', 'spill_path', 'runs', 'spilled', 'spilled_counts', 'merges', 'cleanup', '__weakref__')
+
+    # max_count, max_length and drop_spaces are the pruning limits; None/False keeps every term.
+    # memory_budget (bytes) spills postings to temporary files in spill_dir once reached.
+    def __init__(self, max_count=None, max_length=None, drop_spaces=False, memory_budget=None, spill_dir=None):
+        self.term_ids = {}
+        self.terms = []
+        self.page_ids = {}
+        self.page_books = []
+        self.page_numbers = []
+        self.occurrence_terms = array('I')
+        self.occurrence_pages = array('I')
+        self.posting_terms = None
+        self.max_count = max_count
+        self.max_length = max_length
+        self.drop_spaces = drop_spaces
+        # Pages each term was seen on while it is still kept, the last of them, and tombstones
+        self.seen_pages = array('I')
+        self.last_page = array('i')
+        self.dropped = bytearray()
+        self.fresh_page = None
+        # Spilled runs as (path, postings), occurrences spilled so far and their counts per term
+        self.spill_at = max(memory_budget // OCCURRENCE_BYTES, 1) if memory_budget else None
+        self.spill_dir = spill_dir
+        self.spill_path = None
+        self.runs = []
+        self.spilled = 0
+        self.spilled_counts = np.zeros(0, dtype=np.int64)
+        self.merges = 0
+        self.cleanup = None
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __contains__(self, term):
+        return term in self.term_ids
+
+    # Whether a new term can never pass the filter
+    def rejects(self, term):
+        return (self.drop_spaces and ' ' in term) or (self.max_length is not None and len(term) > self.max_length)
+
+    # Add the rows (page, title, *words) of a book; a word equal to its page number is skipped
+    def add_pages(self, book, pages):
+        term_ids = self.term_ids
+        occurrence_terms = self.occurrence_terms
+        occurrence_pages = self.occurrence_pages
+        seen_pages = self.seen_pages
+        last_page = self.last_page
+        dropped = self.dropped
+        max_count = self.max_count
+        spill_at = self.spill_at
+        newly_dropped = False
+        for p in pages:
+            key = (book, p[0])
+            page_id = self.page_ids.get(key)
+            if page_id is None:
+                page_id = self.page_ids[key] = len(self.page_numbers)
+                self.page_books.append(book)
+                self.page_numbers.append(p[0])
+                self.fresh_page = page_id
+            elif page_id != self.fresh_page:
+                # A page number seen again further back (such as pages without a number):
+                # from here on a term may already be recorded on the current page, so page
+                # counts are only taken on pages that are new since then
+                self.fresh_page = None
+            counting = max_count is not None and page_id == self.fresh_page
+            for w in p[2:]:
+                if w is None or w == p[0]:
+                    continue
+                term_id = term_ids.get(w)
+                if term_id is None:
+                    term_id = term_ids[w] = len(self.terms)
+                    self.terms.append(w)
+                    seen_pages.append(0)
+                    last_page.append(-1)
+                    dropped.append(self.rejects(w))
+                if dropped[term_id]:
+                    continue
+                if counting and last_page[term_id] != page_id:
+                    last_page[term_id] = page_id
+                    seen_pages[term_id] += 1
+                    if seen_pages[term_id] >= max_count:
+                        dropped[term_id] = 1
+                        newly_dropped = True
+                        continue
+                occurrence_terms.append(term_id)
+                occurrence_pages.append(page_id)
+            if spill_at is not None and len(occurrence_terms) >= spill_at:
+                self.spill()
+        if newly_dropped:
+            self.compact()
+        self.posting_terms = None
+
+    # Remove the occurrences of dropped terms
+    def compact(self):
+        terms = np.array(self.occurrence_terms, dtype=np.uint32)
+        keep = np.array(self.dropped, dtype=np.uint8)[terms] == 0
+        self.occurrence_terms = array('I')
+        self.occurrence_terms.frombytes(terms[keep].tobytes())
+        pages = np.array(self.occurrence_pages, dtype=np.uint32)[keep]
+        self.occurrence_pages = array('I')
+        self.occurrence_pages.frombytes(pages.tobytes())
+
+    # Postings (term, page, tf, first occurrence) of the buffered occurrences, sorted by term;
+    # the postings of a term keep the order in which its pages were first seen
+    def block_postings(self):
+        page_count = max(len(self.page_numbers), 1)
+        terms = np.array(self.occurrence_terms, dtype=np.int64)
+        keys = terms * page_count + np.array(self.occurrence_pages, dtype=np.int64)
+        keys, first, tf = np.unique(keys, return_index=True, return_counts=True)
+        order = np.lexsort((first, keys // page_count))
+        keys = keys[order]
+        return keys // page_count, keys % page_count, tf[order], first[order], np.bincount(terms, minlength=len(self.terms))
+
+    # Directory of the spilled runs, removed with the index
+    def get_spill_path(self):
+        if self.spill_path is None:
+            self.spill_path = tempfile.mkdtemp(prefix='indexer-spill-', dir=self.spill_dir)
+            self.cleanup = weakref.finalize(self, shutil.rmtree, self.spill_path, ignore_errors=True)
+        return self.spill_path
+
+    # Write the buffered occurrences as a sorted run and empty the buffer
+    def spill(self):
+        if not len(self.occurrence_terms):
+            return
+        terms, pages, tf, first, counts = self.block_postings()
+        path = os.path.join(self.get_spill_path(), f'run{len(self.runs)}.bin')
+        with open(path, 'wb') as f:
+            for (_, dtype), column in zip(RUN_COLUMNS, (terms, pages, tf, first + self.spilled)):
+                column.astype(dtype).tofile(f)
+        self.runs.append((path, len(terms)))
+        self.spilled += len(self.occurrence_terms)
+        self.spilled_counts = np.concatenate([self.spilled_counts, np.zeros(len(counts) - len(self.spilled_counts), dtype=np.int64)]) + counts
+        del self.occurrence_terms[:]
+        del self.occurrence_pages[:]
+
+    # Memory-mapped columns of a file written column after column
+    def map_columns(self, path, length, columns):
+        mapped = {}
+        offset = 0
+        for name, dtype in columns:
+            mapped[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(length,)) if length else np.zeros(0, dtype=dtype)
+            offset += length * np.dtype(dtype).itemsize
+        return mapped
+
+    # Merge all runs into one postings file, a range of term ids at a time so that each
+    # step stays within the memory budget. Dropped terms are left out.
+    def merge_runs(self):
+        term_count = len(self.terms)
+        page_count = max(len(self.page_numbers), 1)
+        runs = [self.map_columns(path, length, RUN_COLUMNS) for path, length in self.runs]
+        counts = self.spilled_counts
+        dropped = np.array(self.dropped, dtype=np.uint8) != 0
+        # Term id boundaries where the number of occurrences (an upper bound on postings) fills a step
+        step = max(self.spill_at * OCCURRENCE_BYTES // MERGE_BYTES, 1)
+        total = np.cumsum(counts)
+        bounds = np.unique(np.concatenate([[0], np.searchsorted(total, np.arange(step, total[-1] if len(total) else 0, step), side='right'), [term_count]]))
+        # Postings of an earlier merge are superseded
+        for name, _ in POSTING_COLUMNS:
+            path = os.path.join(self.get_spill_path(), f'merged{self.merges}.{name}')
+            if os.path.exists(path):
+                os.remove(path)
+        self.merges += 1
+        paths = {name: os.path.join(self.get_spill_path(), f'merged{self.merges}.{name}') for name, _ in POSTING_COLUMNS}
+        files = {name: open(path, 'wb') for name, path in paths.items()}
+        length = 0
+        try:
+            for low, high in zip(bounds[:-1], bounds[1:]):
+                parts = []
+                for run in runs:
+                    start, end = np.searchsorted(run['term'], np.array([low, high], dtype=np.uint32))
+                    parts.append({name: run[name][start:end] for name, _ in RUN_COLUMNS})
+                block = {name: np.concatenate([part[name] for part in parts]).astype(np.int64) for name, _ in RUN_COLUMNS}
+                keep = ~dropped[block['term']]
+                block = {name: column[keep] for name, column in block.items()}
+                if not len(block['term']):
+                    continue
+                # A page can be in several runs when its page number was seen again later
+                keys = block['term'] * page_count + block['page']
+                order = np.lexsort((block['first'], keys))
+                keys = keys[order]
+                starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+                tf = np.add.reduceat(block['tf'][order], starts)
+                first = block['first'][order][starts]
+                terms = keys[starts] // page_count
+                pages = keys[starts] % page_count
+                order = np.lexsort((first, terms))
+                for (name, dtype), column in zip(POSTING_COLUMNS, (terms, pages, tf)):
+                    column[order].astype(dtype).tofile(files[name])
+                length += len(order)
+        finally:
+            for f in files.values():
+                f.close()
+            del runs
+        merged = {name: self.map_columns(paths[name], length, [(name, dtype)])[name] for name, dtype in POSTING_COLUMNS}
+        return merged['term'], merged['page'], merged['tf'], np.concatenate([counts, np.zeros(term_count - len(counts), dtype=np.int64)])
+
+    # Merge the occurrences into postings; kept until more pages are added
+    def freeze(self):
+        if self.posting_terms is not None:
+            return
+        if self.runs:
+            self.spill()
+            self.set_postings(*self.merge_runs())
+        else:
+            terms, pages, tf, _, counts = self.block_postings()
+            self.set_postings(terms, pages, tf, counts)
+
+    # Set the postings (term, page, tf) sorted by term and the occurrence count of every term,
+    # and derive the term table that filter uses
+    def set_postings(self, terms, pages, tf, counts):
+        term_count = len(self.terms)
+        self.posting_terms = terms
+        self.posting_pages = pages
+        self.posting_tf = tf
+        self.term_count = counts
+        self.term_start = np.searchsorted(terms, np.arange(term_count + 1, dtype=terms.dtype))
+        self.term_df = np.diff(self.term_start)
+        self.term_length = np.fromiter(map(len, self.terms), dtype=np.int64, count=term_count)
+        self.term_spaces = np.fromiter((' ' in term for term in self.terms), dtype=bool, count=term_count)
+
+    # Frozen index from its term table, pages and postings; pages cannot be added to it
+    @classmethod
+    def frozen(cls, terms, page_books, page_numbers, dropped, postings, counts, max_count=None, max_length=None, drop_spaces=False):
+        index = cls(max_count=max_count, max_length=max_length, drop_spaces=drop_spaces)
+        index.terms = terms
+        index.term_ids = dict(zip(terms, range(len(terms))))
+        index.page_books = page_books
+        index.page_numbers = page_numbers
+        index.page_ids = dict(zip(zip(page_books, page_numbers), range(len(page_numbers))))
+        index.dropped = bytearray(np.asarray(dropped, dtype=np.uint8).tobytes())
+        index.set_postings(*postings, counts)
+        return index
+
+    # Index of several books from an index per book, given as (book, index) in book order. It
+    # is the same as adding the pages of the books one after another to one index with the
+    # same pruning limits: a term dropped in any book is dropped, and the postings of a term
+    # keep book order.
+    @classmethod
+    def combine(cls, books, max_count=None, max_length=None, drop_spaces=False):
+        term_ids = {}
+        terms = []
+        page_books = []
+        page_numbers = []
+        parts = []
+        for book, index in books:
+            index.freeze()
+            term_map = np.empty(len(index.terms), dtype=np.int64)
+            for local_id, term in enumerate(index.terms):
+                term_id = term_ids.get(term)
+                if term_id is None:
+                    term_id = term_ids[term] = len(terms)
+                    terms.append(term)
+                term_map[local_id] = term_id
+            parts.append((term_map, len(page_numbers), index))
+            page_books.extend([book] * len(index.page_numbers))
+            page_numbers.extend(index.page_numbers)
+        dropped = np.zeros(len(terms), dtype=bool)
+        counts = np.zeros(len(terms), dtype=np.int64)
+        for term_map, _, index in parts:
+            dropped[term_map] |= np.array(index.dropped, dtype=np.uint8) != 0
+            counts[term_map] += index.term_count
+        columns = [[], [], []]
+        for term_map, page_offset, index in parts:
+            posting_terms = term_map[index.posting_terms]
+            keep = ~dropped[posting_terms]
+            columns[0].append(posting_terms[keep])
+            columns[1].append(np.asarray(index.posting_pages, dtype=np.int64)[keep] + page_offset)
+            columns[2].append(np.asarray(index.posting_tf, dtype=np.int64)[keep])
+        posting_terms, posting_pages, posting_tf = (np.concatenate(column) if column else np.zeros(0, dtype=np.int64) for column in columns)
+        # A stable sort keeps the books, and the pages within a book, in order
+        order = np.argsort(posting_terms, kind='stable')
+        return cls.frozen(terms, page_books, page_numbers, dropped, (posting_terms[order], posting_pages[order], posting_tf[order]), counts,
+                          max_count=max_count, max_length=max_length, drop_spaces=drop_spaces)
+
+    # Add the index of the next book (such as a segment) as one spilled run, so that a course
+    # index with a memory budget is combined without holding every book's postings in memory.
+    # Adding the books in book order gives the same index as combine.
+    def add_book_run(self, book, index):
+        index.freeze()
+        term_map = np.empty(len(index.terms), dtype=np.int64)
+        for local_id, term in enumerate(index.terms):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                term_id = self.term_ids[term] = len(self.terms)
+                self.terms.append(term)
+                self.seen_pages.append(0)
+                self.last_page.append(-1)
+                self.dropped.append(0)
+            term_map[local_id] = term_id
+        dropped = np.array(self.dropped, dtype=np.uint8)
+        dropped[term_map] |= np.array(index.dropped, dtype=np.uint8)
+        self.dropped = bytearray(dropped.tobytes())
+        page_offset = len(self.page_numbers)
+        for number in index.page_numbers:
+            self.page_ids[(book, number)] = len(self.page_numbers)
+            self.page_books.append(book)
+            self.page_numbers.append(number)
+        counts = np.concatenate([self.spilled_counts, np.zeros(len(self.terms) - len(self.spilled_counts), dtype=np.int64)])
+        np.add.at(counts, term_map, np.asarray(index.term_count, dtype=np.int64))
+        self.spilled_counts = counts
+        # The run is sorted by the ids of this index; the first column keeps the page order
+        # of every term within the book, and after the books before it
+        terms = term_map[np.asarray(index.posting_terms, dtype=np.int64)]
+        order = np.argsort(terms, kind='stable')
+        first = self.spilled + order
+        pages = np.asarray(index.posting_pages, dtype=np.int64)[order] + page_offset
+        path = os.path.join(self.get_spill_path(), f'run{len(self.runs)}.bin')
+        with open(path, 'wb') as f:
+            for (_, dtype), column in zip(RUN_COLUMNS, (terms[order], pages, np.asarray(index.posting_tf)[order], first)):
+                column.astype(dtype).tofile(f)
+        self.runs.append((path, len(terms)))
+        self.spilled += len(terms)
+        self.posting_terms = None
+
+    # Remove the spilled runs and postings files
+    def close(self):
+        if self.cleanup is not None:
+            self.posting_terms = self.posting_pages = self.posting_tf = None
+            self.cleanup()
+
+    # Write the kept terms (or term_ids) with their pages as a term table for search.py
+    def write_term_table(self, path, term_ids=None):
+        self.freeze()
+        if term_ids is None:
+            term_ids = np.flatnonzero(np.array(self.dropped, dtype=np.uint8) == 0)
+        terms = sorted((self.terms[term_id].encode('utf-8'), term_id) for term_id in np.asarray(term_ids).tolist())
+        term_blob = b''.join(term + b'\0' for term, _ in terms)
+        term_ids = np.array([term_id for _, term_id in terms], dtype=np.int64)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.uint32)
+        np.cumsum([len(term) + 1 for term, _ in terms], out=term_offsets[1:])
+
+        # Postings of the terms in table order
+        starts = self.term_start[term_ids]
+        lengths = self.term_start[term_ids + 1] - starts
+        posting_offsets = np.zeros(len(terms) + 1, dtype=np.uint32)
+        np.cumsum(lengths, out=posting_offsets[1:])
+        postings = np.asarray(self.posting_pages)[np.repeat(starts - posting_offsets[:-1], lengths) + np.arange(posting_offsets[-1])]
+
+        # Every suffix starting on a character boundary, sorted by its bytes up to the NUL that
+        # ends its term (bytes after the NUL only order equal suffixes)
+        blob = np.frombuffer(term_blob, dtype=np.uint8)
+        suffixes = np.flatnonzero((blob != 0) & ((blob & 0xC0) != 0x80))
+        width = int(np.diff(term_offsets).max()) if len(terms) else 1
+        windows = np.lib.stride_tricks.sliding_window_view(np.concatenate([blob, np.zeros(width, dtype=np.uint8)]), width)
+        suffixes = suffixes[np.argsort(np.ascontiguousarray(windows[suffixes]).view(f'S{width}').ravel(), kind='stable')]
+
+        pages = [str(number).encode('utf-8') for number in self.page_numbers]
+        page_offsets = np.zeros(len(pages) + 1, dtype=np.uint32)
+        np.cumsum([len(page) for page in pages], out=page_offsets[1:])
+
+        # Written to a temporary file first so that a failed write never leaves a truncated table
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, TABLE_VERSION, BYTEORDERS[sys.byteorder], len(terms), len(pages), len(postings), len(suffixes)))
+            for values in (term_offsets, posting_offsets, postings, self.page_books, page_offsets, suffixes):
+                np.asarray(values, dtype=np.uint32).tofile(f)
+            f.write(term_blob)
+            f.write(b''.join(pages))
+        os.replace(tmp_path, path)
+
+    # Keep the terms without spaces seen at least min_count times, on fewer than max_count
+    # pages and at most max_length characters long
+    def filter(self, min_count=1, max_count=10, max_length=30):
+        if self.max_count is not None and max_count > self.max_count:
+            raise ValueError(f'Index was pruned at {self.max_count} pages, cannot filter at {max_count}')
+        if self.max_length is not None and max_length > self.max_length:
+            raise ValueError(f'Index was pruned at {self.max_length} characters, cannot filter at {max_length}')
+        self.freeze()
+        mask = (np.array(self.dropped, dtype=np.uint8) == 0) & ~self.term_spaces & (self.term_count >= min_count) & (self.term_df < max_count) & (self.term_length <= max_length)
+        return IndexSelection(self, np.flatnonzero(mask))
+
+    # (book, page, tf) of every page a term occurs on
+    def postings(self, term_id):
+        self.freeze()
+        start, end = self.term_start[term_id], self.term_start[term_id + 1]
+        return [(self.page_books[page], self.page_numbers[page], int(tf))
+                for page, tf in zip(self.posting_pages[start:end].tolist(), self.posting_tf[start:end].tolist())]
+
+    # (term, book, page) of every posting, grouped by term
+    def entries(self, term_ids=None):
+        self.freeze()
+        if term_ids is None:
+            term_ids = range(len(self.terms))
+        for term_id in term_ids:
+            term = self.terms[term_id]
+            for page in self.posting_pages[self.term_start[term_id]:self.term_start[term_id + 1]].tolist():
+                yield term, self.page_books[page], self.page_numbers[page]
+
+
+# A subset of the terms of an inverted index, such as the result of a filter
+class IndexSelection:
+    __slots__ = ('index', 'term_ids')
+
+    def __init__(self, index, term_ids):
+        self.index = index
+        self.term_ids = term_ids
+
+    def __len__(self):
+        return len(self.term_ids)
+
+    def __iter__(self):
+        return (self.index.terms[term_id] for term_id in self.term_ids.tolist())
+
+    def entries(self):
+        return self.index.entries(self.term_ids.tolist())
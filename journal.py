@@ -0,0 +1,94 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Page-level checkpoint journal for book extraction. Scanned pages (title
+#                   and text) and parsed pages are appended to a JSON-lines file next to the
+#                   output CSV as soon as they are done, so an interrupted run can resume
+#                   where it stopped. A journal is only reused when both the PDF content and
+#                   the processor settings are unchanged.
+#
+# ---------------------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+
+JOURNAL_VERSION = 1
+
+
+# SHA-256 of a file's content
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BookJournal:
+    # Open the journal of a book. With resume, pages recorded by an earlier run with the
+    # same PDF and settings are loaded; otherwise any existing journal is discarded.
+    def __init__(self, path, pdf_path, settings, resume=False):
+        self.path = path
+        self.key = hashlib.sha256((file_hash(pdf_path) + json.dumps(settings, sort_keys=True)).encode()).hexdigest()
+        self.scans = {}
+        self.pages = {}
+        if not (resume and self.load()):
+            with open(path, 'w') as f:
+                f.write(json.dumps({'journal': JOURNAL_VERSION, 'key': self.key}) + '\n')
+        self.file = open(path, 'a')
+
+    # Load recorded pages; returns False when the journal is missing or does not match
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'rb+') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = None
+            if header != {'journal': JOURNAL_VERSION, 'key': self.key}:
+                print(f"[WARNING] Journal {self.path} does not match the PDF or settings. Starting over.")
+                return False
+            good = f.tell()
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn write from an interrupted run: drop it and everything after it
+                    break
+                if entry['type'] == 'scan':
+                    self.scans[entry['index']] = entry['record']
+                else:
+                    self.pages[entry['index']] = entry['element']
+                good += len(line)
+            f.truncate(good)
+        return True
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+    # Record a scanned page (title and text)
+    def add_scan(self, record):
+        self.scans[record['index']] = record
+        self.write({'type': 'scan', 'index': record['index'], 'record': record})
+
+    # Record a parsed page; the raw text is already part of its scan record
+    def add_page(self, index, element):
+        element = {key: value for key, value in element.items() if key != 'raw'}
+        self.pages[index] = element
+        self.write({'type': 'page', 'index': index, 'element': element})
+
+    # Parsed page for a scan record, if it was recorded
+    def get_page(self, record):
+        if record['index'] not in self.pages:
+            return None
+        return {**self.pages[record['index']], 'raw': record['text']}
+
+    def close(self):
+        self.file.close()
+
+    # Close and delete the journal once the book's output is written
+    def remove(self):
+        self.close()
+        os.remove(self.path)
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      In-process replacement for makeindex. Reads the \indexentry lines of an
+#                   .idx file, sorts them with makeindex's collation (symbols, then numbers,
+#                   then letters case-insensitively; levels by ! and sort keys by @; pages by
+#                   type and value) and writes the .ind file with the style of an .ist file,
+#                   including implicit page ranges, |( |) explicit ranges, encapsulators and
+#                   line wrapping. Compare mode runs the real makeindex on the same input and
+#                   prints the differences.
+#
+# BASIC USAGE:      python3 makeindex.py main.idx -s std.ist
+#                   python3 makeindex.py main.idx -s std.ist --compare
+#
+# ---------------------------------------------------------------------------------------------
+
+import os
+import re
+import sys
+import shutil
+import difflib
+import argparse
+import tempfile
+import subprocess
+
+# makeindex's default style; an .ist file overrides any of these
+DEFAULT_STYLE = {
+    'keyword': '\\indexentry',
+    'arg_open': '{',
+    'arg_close': '}',
+    'range_open': '(',
+    'range_close': ')',
+    'level': '!',
+    'actual': '@',
+    'encap': '|',
+    'quote': '"',
+    'escape': '\\',
+    'page_compositor': '-',
+    'page_precedence': 'rnaRA',
+    'preamble': '\\begin{theindex}\n',
+    'postamble': '\n\n\\end{theindex}\n',
+    'setpage_prefix': '\n  \\setcounter{page}{',
+    'setpage_suffix': '}\n',
+    'group_skip': '\n\n  \\indexspace\n',
+    'headings_flag': 0,
+    'heading_prefix': '',
+    'heading_suffix': '',
+    'symhead_positive': 'Symbols',
+    'symhead_negative': 'symbols',
+    'numhead_positive': 'Numbers',
+    'numhead_negative': 'numbers',
+    'item_0': '\n  \\item ',
+    'item_1': '\n    \\subitem ',
+    'item_2': '\n      \\subsubitem ',
+    'item_01': '\n    \\subitem ',
+    'item_x1': '\n    \\subitem ',
+    'item_12': '\n      \\subsubitem ',
+    'item_x2': '\n      \\subsubitem ',
+    'delim_0': ', ',
+    'delim_1': ', ',
+    'delim_2': ', ',
+    'delim_n': ', ',
+    'delim_r': '--',
+    'delim_t': '',
+    'encap_prefix': '\\',
+    'encap_infix': '{',
+    'encap_suffix': '}',
+    'suffix_2p': '',
+    'suffix_3p': '',
+    'suffix_mp': '',
+    'line_max': 72,
+    'indent_space': '\t\t',
+    'indent_length': 16
+}
+# Index levels (primary, secondary, tertiary)
+FIELD_MAX = 3
+# Entry types; an open range sorts before and a close range after other entries on the same page
+OPEN, NORMAL, CLOSE = 0, 1, 2
+# Groups of a sort key, in sort order
+EMPTY, SYMBOL, DIGIT_SYMBOL, NUMBER, ALPHA = range(5)
+ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100, 'd': 500, 'm': 1000}
+STYLE_ESCAPES = {'n': '\n', 't': '\t', '\\': '\\', '"': '"', "'": "'"}
+STYLE_PATTERN = re.compile(r'''\s*(\w+)\s+("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)'|-?\d+)''')
+
+
+# Read an .ist style file over the default style
+def read_style(path=None):
+    style = dict(DEFAULT_STYLE)
+    if not path:
+        return style
+    with open(path) as f:
+        settings = [STYLE_PATTERN.match(line) for line in f]
+    for key, value in (match.groups() for match in settings if match):
+        if value[0] in '"\'':
+            value = re.sub(r'\\(.)', lambda m: STYLE_ESCAPES.get(m.group(1), m.group(1)), value[1:-1])
+        else:
+            value = int(value)
+        style[key] = value
+    return style
+
+
+class IndexEntry:
+    __slots__ = ('sort', 'actual', 'encap', 'type', 'page', 'page_key', 'order', 'key')
+
+    def __init__(self, sort, actual, encap, type, page, page_key, order):
+        self.sort = sort
+        self.actual = actual
+        self.encap = encap
+        self.type = type
+        self.page = page
+        self.page_key = page_key
+        self.order = order
+        self.key = tuple((compare_key(s), compare_key(a)) for s, a in zip(sort, actual))
+
+    # The text printed for a level: the actual key if given, else the sort key
+    def text(self, level):
+        return self.actual[level] or self.sort[level]
+
+
+# Group of a sort key: pure numbers, symbols (split by a leading digit) and letters
+def group_type(key):
+    if not key:
+        return EMPTY
+    if key.isascii() and key.isdigit():
+        return NUMBER
+    # makeindex's ISSYMBOL range starts at '!', so a leading space sorts with the letters
+    if '!' <= key[0] <= '~' and not key[0].isalpha():
+        return DIGIT_SYMBOL if key[0].isdigit() else SYMBOL
+    return ALPHA
+
+
+# Sort key of one field: group, then the number or the bytes. Letters compare case-insensitively
+# with the exact bytes as tie-break; symbols and digits compare exactly, like check_mixsym
+def compare_key(key):
+    group = group_type(key)
+    if group == NUMBER:
+        return (group, int(key), b'', b'')
+    raw = key.encode('utf-8')
+    if group == ALPHA:
+        return (group, 0, raw.lower(), raw)
+    return (group, 0, raw, raw)
+
+
+# Split the key argument of an entry into levels of sort key and actual key, and the encap
+def scan_key(key, style):
+    levels = [['', '']]
+    part = 0
+    encap = None
+    i = 0
+    while i < len(key):
+        c = key[i]
+        if c == style['quote'] and (i == 0 or key[i - 1] != style['escape']) and i + 1 < len(key):
+            levels[-1][part] += key[i + 1]
+            i += 2
+            continue
+        if c == style['level']:
+            if len(levels) == FIELD_MAX:
+                raise ValueError('Too many levels')
+            levels.append(['', ''])
+            part = 0
+        elif c == style['actual']:
+            if part == 1:
+                raise ValueError('Extra actual key')
+            part = 1
+        elif c == style['encap']:
+            encap = key[i + 1:]
+            break
+        else:
+            levels[-1][part] += c
+        i += 1
+    sort = [level[0] for level in levels]
+    actual = [level[1] for level in levels]
+    if any(not s for s in sort):
+        raise ValueError('Empty sort key')
+    return sort, actual, encap or ''
+
+
+# Sort key of a page number: each part separated by the page compositor is a roman, arabic
+# or alphabetic number ranked by page_precedence
+def page_key(page, style):
+    if not page:
+        raise ValueError('Empty page number')
+    key = []
+    for part in page.split(style['page_compositor']):
+        if part.isascii() and part.isdigit():
+            kind, value = 'n', int(part)
+        elif part and all(c in ROMAN_VALUES for c in part):
+            kind, value = 'r', roman_value(part)
+        elif part and all(c.upper() in ROMAN_VALUES for c in part) and part.isupper():
+            kind, value = 'R', roman_value(part.lower())
+        elif len(part) == 1 and part.isascii() and part.isalpha():
+            kind, value = ('a' if part.islower() else 'A'), ord(part.lower()) - ord('a')
+        else:
+            raise ValueError(f'Illegal page number {page}')
+        key.append((style['page_precedence'].index(kind), value))
+    return tuple(key)
+
+
+def roman_value(numeral):
+    total = 0
+    for i, c in enumerate(numeral):
+        value = ROMAN_VALUES[c]
+        if i + 1 < len(numeral) and ROMAN_VALUES[numeral[i + 1]] > value:
+            total -= value
+        else:
+            total += value
+    return total
+
+
+# The brace-delimited argument starting at text[start]; returns it and the index after it
+def scan_arg(text, start, style):
+    if start >= len(text) or text[start] != style['arg_open']:
+        raise ValueError('Missing argument')
+    depth = 0
+    i = start
+    while i < len(text):
+        c = text[i]
+        if c == style['quote'] and i + 1 < len(text) and text[i - 1] != style['escape']:
+            i += 2
+            continue
+        if c == style['arg_open']:
+            depth += 1
+        elif c == style['arg_close']:
+            depth -= 1
+            if depth == 0:
+                return text[start + 1:i], i + 1
+        i += 1
+    raise ValueError('Unbalanced braces')
+
+
+# Parse the entries of an .idx file; returns the entries and the rejected lines
+def read_idx(lines, style):
+    entries = []
+    rejected = []
+    keyword = style['keyword']
+    for n, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if not line.startswith(keyword):
+                raise ValueError('Unknown keyword')
+            key, end = scan_arg(line, len(keyword), style)
+            page, _ = scan_arg(line, end, style)
+            sort, actual, encap = scan_key(key, style)
+            kind = NORMAL
+            if encap[:1] == style['range_open']:
+                kind, encap = OPEN, encap[1:]
+            elif encap[:1] == style['range_close']:
+                kind, encap = CLOSE, encap[1:]
+            entries.append(IndexEntry(sort, actual, encap, kind, page, page_key(page, style), n))
+        except ValueError as e:
+            rejected.append((n + 1, line, str(e)))
+    return entries, rejected
+
+
+# Sort entries like makeindex and drop exact duplicates
+def sort_entries(entries):
+    entries = sorted(entries, key=lambda e: (e.key, e.page_key, e.type, e.order))
+    result = []
+    seen = set()
+    for e in entries:
+        identity = (e.key, tuple(e.sort), tuple(e.actual), e.page, e.encap, e.type)
+        if identity not in seen:
+            seen.add(identity)
+            result.append(e)
+    return result
+
+
+# Whether page b directly follows page a
+def consecutive(a, b):
+    return len(a) == len(b) and a[:-1] == b[:-1] and a[-1][0] == b[-1][0] and b[-1][1] == a[-1][1] + 1
+
+
+# The items of a sorted index: groups, items of each level and their page lists
+class IndexItems:
+    def __init__(self, style):
+        self.style = style
+        self.warnings = []
+
+    # Page list of one item as (encap, pages) pairs: implicit ranges of consecutive pages
+    # with the same encap and explicit |( |) ranges
+    def page_list(self, entries):
+        style = self.style
+        pages = []
+        run = None
+        open_range = None
+
+        def flush_run():
+            if run is None:
+                return
+            first, last, count, encap = run
+            if count == 1:
+                pages.append((encap, first.page))
+            elif count == 2 and style['suffix_2p']:
+                pages.append((encap, first.page + style['suffix_2p']))
+            elif count == 2:
+                pages.extend([(encap, first.page), (encap, last.page)])
+            elif count == 3 and style['suffix_3p']:
+                pages.append((encap, first.page + style['suffix_3p']))
+            elif style['suffix_mp']:
+                pages.append((encap, first.page + style['suffix_mp']))
+            else:
+                pages.append((encap, first.page + style['delim_r'] + last.page))
+
+        for e in entries:
+            if open_range is not None:
+                if e.encap != open_range.encap:
+                    self.warnings.append(f'Inconsistent page encapsulator {e.encap} within range ({e.page})')
+                elif e.type == CLOSE:
+                    text = open_range.page if e.page == open_range.page else open_range.page + style['delim_r'] + e.page
+                    pages.append((e.encap, text))
+                    open_range = None
+                elif e.type == OPEN:
+                    self.warnings.append(f'Extra range opening operator ({e.page})')
+                continue
+            if e.type == OPEN:
+                flush_run()
+                run = None
+                open_range = e
+            elif e.type == CLOSE:
+                self.warnings.append(f'Unmatched range closing operator ({e.page})')
+            elif run is not None and run[3] == e.encap and consecutive(run[1].page_key, e.page_key):
+                run = (run[0], e, run[2] + 1, run[3])
+            else:
+                flush_run()
+                run = (e, e, 1, e.encap)
+        flush_run()
+        if open_range is not None:
+            self.warnings.append(f'Unmatched range opening operator ({open_range.page})')
+            pages.append((open_range.encap, open_range.page))
+        return pages
+
+    # Whether a new group starts between two primary keys
+    def new_group(self, prev, curr):
+        prev_group, curr_group = group_type(prev), group_type(curr)
+        if curr_group == ALPHA:
+            return prev_group != ALPHA or curr[0].lower() != prev[0].lower()
+        return prev_group in (SYMBOL, DIGIT_SYMBOL) and curr_group == NUMBER
+
+    # The sorted entries as ('group', primary key) when a group starts and
+    # ('item', item style, level, text, pages) for every item; parents printed only
+    # for their sub-items have no pages
+    def items(self, entries):
+        style = self.style
+        prev = None
+        i = 0
+        while i < len(entries):
+            curr = entries[i]
+            # All entries of the same item share its page list
+            j = i + 1
+            while j < len(entries) and entries[j].sort == curr.sort and entries[j].actual == curr.actual:
+                j += 1
+            if prev is None or self.new_group(prev.sort[0], curr.sort[0]):
+                yield 'group', curr.sort[0]
+            # First level that differs from the previous item
+            depth = 0
+            if prev is not None:
+                while (depth < len(prev.sort) and depth < len(curr.sort) and prev.sort[depth] == curr.sort[depth]
+                       and prev.actual[depth] == curr.actual[depth]):
+                    depth += 1
+            last = len(curr.sort) - 1
+            for level in range(depth, last + 1):
+                if level == 0:
+                    item = 'item_0'
+                elif level > depth:
+                    item = f'item_x{level}'
+                elif len(prev.sort) == level:
+                    # The previous item is the parent, which has pages
+                    item = f'item_{level - 1}{level}'
+                else:
+                    item = f'item_{level}'
+                yield 'item', item, level, curr.text(level), self.page_list(entries[i:j]) if level == last else []
+            prev = curr
+            i = j
+
+
+# Writes the items of a sorted index as an .ind file
+class IndWriter(IndexItems):
+    def __init__(self, style, out):
+        super().__init__(style)
+        self.out = out
+
+    def encap(self, encap, text):
+        if not encap:
+            return text
+        return self.style['encap_prefix'] + encap + self.style['encap_infix'] + text + self.style['encap_suffix']
+
+    # Write an item and its page list, wrapping lines longer than line_max
+    def put_item(self, item, level, pages):
+        style = self.style
+        if not pages:
+            self.out.write(item)
+            return
+        pages = [self.encap(encap, text) for encap, text in pages]
+        line = item + style[f'delim_{min(level, 2)}']
+        indent = 0
+        for n, page in enumerate(pages):
+            last = n == len(pages) - 1
+            if len(line) + len(page) + indent > style['line_max']:
+                self.out.write(line + '\n')
+                if last:
+                    self.out.write(style['indent_space'] + page)
+                else:
+                    line = style['indent_space'] + page + style['delim_n']
+                indent = style['indent_length']
+            elif last:
+                self.out.write(line + page)
+            else:
+                line += page + style['delim_n']
+        self.out.write(style['delim_t'])
+
+    # Heading of the group of a primary key
+    def heading(self, key):
+        style = self.style
+        flag = style['headings_flag']
+        group = group_type(key)
+        if group in (SYMBOL, DIGIT_SYMBOL):
+            text = style['symhead_positive'] if flag > 0 else style['symhead_negative']
+        elif group == NUMBER:
+            text = style['numhead_positive'] if flag > 0 else style['numhead_negative']
+        else:
+            text = key[0].upper() if flag > 0 else key[0].lower()
+        return style['heading_prefix'] + text + style['heading_suffix']
+
+    # Write the sorted entries as an .ind file
+    def write(self, entries):
+        style = self.style
+        self.out.write(style['preamble'])
+        first = True
+        for event in self.items(entries):
+            if event[0] == 'group':
+                if not first:
+                    self.out.write(style['group_skip'])
+                if style['headings_flag']:
+                    self.out.write(self.heading(event[1]))
+                first = False
+                continue
+            _, item, level, text, pages = event
+            self.put_item(style[item] + text, level, pages)
+        self.out.write(style['postamble'])
+
+
+# Sort the entries of an .idx file and write the .ind file; returns the rejected lines and
+# the warnings
+def make_ind(idx_path, ind_path, style_path=None):
+    style = read_style(style_path)
+    with open(idx_path) as f:
+        entries, rejected = read_idx(f, style)
+    with open(ind_path, 'w') as out:
+        writer = IndWriter(style, out)
+        writer.write(sort_entries(entries))
+    return rejected, writer.warnings
+
+
+# Run makeindex on a copy of the .idx file and diff its .ind against ours
+def compare_with_makeindex(idx_path, ind_path, style_path=None):
+    with tempfile.TemporaryDirectory(prefix='indexer-makeindex-') as tmp:
+        shutil.copy(idx_path, os.path.join(tmp, 'main.idx'))
+        command = ['makeindex', '-q', 'main.idx']
+        if style_path:
+            command += ['-s', os.path.abspath(style_path)]
+        subprocess.run(command, cwd=tmp, check=True)
+        with open(os.path.join(tmp, 'main.ind')) as f:
+            expected = f.read().splitlines(keepends=True)
+    with open(ind_path) as f:
+        actual = f.read().splitlines(keepends=True)
+    return list(difflib.unified_diff(expected, actual, 'makeindex', 'native'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('idx', help='Input .idx file')
+    parser.add_argument('-s', '--style', help='Style (.ist) file', required=False)
+    parser.add_argument('-o', '--output', help='Output .ind file (default: the .idx file with .ind)', required=False)
+    parser.add_argument('--compare', action='store_true', help='Also run makeindex and print the differences')
+    args = parser.parse_args()
+
+    ind_path = args.output or os.path.splitext(args.idx)[0] + '.ind'
+    rejected, warnings = make_ind(args.idx, ind_path, args.style)
+    for line_number, line, reason in rejected:
+        print(f'[WARNING] {args.idx}:{line_number}: {reason}: {line}')
+    for warning in warnings:
+        print(f'[WARNING] {warning}')
+    print(f'Wrote {ind_path}')
+    if args.compare:
+        try:
+            diff = compare_with_makeindex(args.idx, ind_path, args.style)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f'[ERROR] Could not run makeindex: {e}')
+            sys.exit(1)
+        if diff:
+            sys.stdout.writelines(diff)
+            print(f'[ERROR] Output differs from makeindex')
+            sys.exit(1)
+        print('Output matches makeindex')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Term extraction engines for page text. An engine analyzes a page once
+#                   and returns its noun phrases and words as candidate index terms.
+#
+#                   textblob  - TextBlob noun phrases and words (the reference term set)
+#                   fast      - one regex tokenization pass and a lightweight chunker that
+#                               joins runs of content words into noun phrases
+#
+# ---------------------------------------------------------------------------------------------
+
+import re
+from textblob import TextBlob
+
+# Tokens: word characters with inner punctuation kept (tcp/ip, c++, node.js, ad-hoc)
+WORD_PATTERN = re.compile(r"\w(?:[\w'+\-./~|]*[\w+])?")
+# Punctuation that ends a phrase when it separates two tokens
+PHRASE_BREAK = re.compile(r'[.,;:!?()\[\]{}"<>\n]')
+# Closed-class words that cannot be part of a noun phrase
+FUNCTION_WORDS = frozenset('''
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each either etc few for from further had has
+have having he her here hers herself him himself his how i if in into is it its itself just let may me
+might more most must my myself no nor not now of off on once only or other our ours ourselves out over
+own per same shall she should so some such than that the their theirs them themselves then there these
+they this those through thus to too under until up upon us very via was we were what when where which
+while who whom why will with within without would yet you your yours yourself yourselves
+'''.split())
+
+
+# TextBlob noun phrases and words. One blob is shared by both, which yields the
+# same terms as separate blobs for each.
+class TextBlobEngine:
+    name = 'textblob'
+
+    def analyze(self, text):
+        return TextBlob(text)
+
+    def noun_phrases(self, doc):
+        return doc.noun_phrases
+
+    def words(self, doc):
+        return doc.words
+
+
+# Single-pass tokenizer with a chunker for noun phrases: runs of content words not
+# interrupted by punctuation, numbers or function words, cut into phrases of two to four words
+class FastEngine:
+    name = 'fast'
+    max_phrase = 4
+
+    # Tokenize once; a token is flagged when punctuation separates it from the previous one
+    def analyze(self, text):
+        tokens = []
+        breaks = []
+        end = 0
+        for match in WORD_PATTERN.finditer(text):
+            breaks.append(PHRASE_BREAK.search(text, end, match.start()) is not None)
+            tokens.append(match.group())
+            end = match.end()
+        return tokens, breaks
+
+    def noun_phrases(self, doc):
+        tokens, breaks = doc
+        phrases = []
+        run = []
+        for token, broken in zip(tokens, breaks):
+            lower = token.lower()
+            content = lower not in FUNCTION_WORDS and not token[0].isdigit()
+            if broken or not content:
+                self.add_phrases(phrases, run)
+                run = []
+            if content:
+                run.append(lower)
+        self.add_phrases(phrases, run)
+        return phrases
+
+    # Cut a run of content words into phrases of at most max_phrase words
+    def add_phrases(self, phrases, run):
+        for start in range(0, len(run), self.max_phrase):
+            chunk = run[start:start + self.max_phrase]
+            if len(chunk) > 1:
+                phrases.append(' '.join(chunk))
+
+    def words(self, doc):
+        return doc[0]
+
+
+NLP_ENGINES = {
+    'textblob': TextBlobEngine,
+    'fast': FastEngine
+}
+
+
+# Create a term extraction engine by name
+def make_nlp_engine(name='textblob'):
+    if name not in NLP_ENGINES:
+        raise ValueError(f"Unknown NLP engine '{name}'")
+    return NLP_ENGINES[name]()
@@ -0,0 +1,84 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      OCR backends for title-bar images. Every backend takes the already
+#                   cropped grayscale NumPy image and returns the raw recognized text.
+#
+#                   tesserocr    - one in-process Tesseract engine kept alive for the
+#                                  lifetime of the backend (pip3 install -r requirements-ocr.txt)
+#                   pytesseract  - runs the 'tesseract' binary once per image
+#
+#                   The identity of a backend names it and its Tesseract version; cached
+#                   titles are keyed by it, so they are never reused across engines.
+#
+# ---------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+# Persistent in-process Tesseract engine. The traineddata is loaded once when the
+# backend is created and reused for every image passed to it.
+class TesserocrBackend:
+    name = 'tesserocr'
+
+    def __init__(self, lang='eng'):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.lang = lang
+        self.api = tesserocr.PyTessBaseAPI(lang=lang)
+        self.identity = f'{self.name} {tesserocr.tesseract_version().splitlines()[0]}'
+
+    # Recognize the text of a grayscale image
+    def image_to_string(self, img):
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        self.api.SetImageBytes(img.tobytes(), img.shape[1], img.shape[0], 1, img.strides[0])
+        return self.api.GetUTF8Text()
+
+    # Release the engine
+    def close(self):
+        self.api.End()
+
+
+# Tesseract through pytesseract: writes a temporary image and starts a new
+# 'tesseract' process for every call
+class PytesseractBackend:
+    name = 'pytesseract'
+
+    def __init__(self, lang='eng'):
+        self.lang = lang
+        self.identity = f'{self.name} tesseract {pytesseract.get_tesseract_version()}'
+
+    # Recognize the text of a grayscale image
+    def image_to_string(self, img):
+        return pytesseract.image_to_string(img, lang=self.lang)
+
+    def close(self):
+        pass
+
+
+OCR_BACKENDS = {
+    'tesserocr': TesserocrBackend,
+    'pytesseract': PytesseractBackend
+}
+
+# Whether the fallback from 'auto' to pytesseract has been reported
+warned_fallback = False
+
+
+# Create an OCR backend by name. 'auto' prefers the persistent in-process engine
+# and falls back to pytesseract when tesserocr is not installed.
+def make_ocr_backend(name='auto', lang='eng'):
+    global warned_fallback
+    if name == 'auto':
+        name = 'tesserocr' if tesserocr is not None else 'pytesseract'
+        if tesserocr is None and not warned_fallback:
+            print("[WARNING] tesserocr is not installed; falling back to pytesseract, which starts one 'tesseract' process per title. Install it with 'pip3 install -r requirements-ocr.txt'.")
+            warned_fallback = True
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend '{name}'")
+    return OCR_BACKENDS[name](lang=lang)
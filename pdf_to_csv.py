@@ -21,11 +21,10 @@ title_left = [382,500,312,313]
 title_sep = [382,500,1661,1668]
 
 def _get_page_title(page):
-    img = _get_page_image(page)
-    boxes = _get_image_boxes(img[
-        top_bounds[0]:top_bounds[1],
-        top_bounds[2]:top_bounds[3]
-    ])
+    # Render only the title-bar region; keep the pixmap alive while its samples are used
+    pix = _get_region_pixmap(page, top_bounds)
+    img = _pixmap_to_array(pix)
+    boxes = _get_image_boxes(img)
     
     # Filter and check if there are two boxes
     boxes = [cnt for cnt in boxes if cnt[0] < 200 and cnt[2] > 500 and cnt[3] > 50]
@@ -35,8 +34,8 @@ def _get_page_title(page):
     # Get cords for title bar
     title_box = _get_title_box(boxes)
     img = img[
-        title_box[0]:title_box[1],
-        title_box[2]:title_box[3]
+        title_box[0] - top_bounds[0]:title_box[1] - top_bounds[0],
+        title_box[2] - top_bounds[2]:title_box[3] - top_bounds[2]
     ]
     
     # Invert image
@@ -55,12 +54,15 @@ def _get_page_title(page):
         return None
     return text
 
-def _get_page_image(page):
-    img_bytes = np.frombuffer(page.get_pixmap(dpi=300).pil_tobytes("JPEG"), dtype=np.uint8)
-    img = cv2.imdecode(img_bytes, cv2.IMREAD_COLOR)
-    img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    #img_inv = cv2.bitwise_not(img_gray)
-    return img_gray
+def _get_region_pixmap(page, bounds):
+    # Bounds are [y0, y1, x0, x1] in 300 DPI pixels; clip is in PDF points
+    clip = fitz.Rect(bounds[2], bounds[0], bounds[3], bounds[1]) * (72 / 300)
+    return page.get_pixmap(dpi=300, colorspace=fitz.csGRAY, clip=clip, alpha=False)
+
+def _pixmap_to_array(pix):
+    # Zero-copy view of the grayscale samples
+    img = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    return img.reshape(pix.height, pix.stride)[:, :pix.width]
 
 def _get_image_boxes(img):
     ret,th1 = cv2.threshold(img,127,255,cv2.THRESH_BINARY)
@@ -0,0 +1,138 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Per-stage timing of the extraction pipeline. StageTimer measures the wall
+#                   time of each stage of a page (optionally running cProfile on one stage),
+#                   ProfileReport aggregates the page timings of every book into a JSON
+#                   summary with percentiles and throughput.
+#
+# ---------------------------------------------------------------------------------------------
+
+import cProfile
+import glob
+import json
+import os
+import pstats
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+STAGES = ['render', 'boxes', 'ocr', 'vector', 'strip', 'noun_phrases', 'tokenize', 'filter_words', 'store_write']
+
+
+class StageTimer:
+    # enabled turns timing on; profile_stage/profile_dump run cProfile on one stage and
+    # dump its statistics to '<profile_dump>.<pid>'
+    def __init__(self, enabled=False, profile_stage=None, profile_dump=None):
+        self.enabled = enabled
+        self.profile_stage = profile_stage
+        self.profile_dump = profile_dump
+        self.profiler = cProfile.Profile() if profile_stage else None
+        self.local = threading.local()
+
+    # Start timing a new page (per thread)
+    def start_page(self):
+        self.local.timings = {}
+
+    # Stage timings of the current page
+    def page_timings(self):
+        return getattr(self.local, 'timings', {})
+
+    # Time a stage of the current page
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        profiling = self.profiler is not None and name == self.profile_stage
+        if profiling:
+            self.profiler.enable()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            if profiling:
+                self.profiler.disable()
+            timings = self.page_timings()
+            timings[name] = timings.get(name, 0) + elapsed
+            self.local.timings = timings
+
+    # Write the cProfile statistics of this process
+    def dump(self):
+        if self.profiler is not None and self.profile_dump and self.profiler.getstats():
+            self.profiler.dump_stats(f'{self.profile_dump}.{os.getpid()}')
+
+
+# Nearest-rank percentile of a sorted list
+def percentile(values, pct):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+# Count, total, mean and percentiles of a list of durations
+def summarize(values):
+    values = sorted(values)
+    total = sum(values)
+    return {
+        'count': len(values),
+        'total': total,
+        'mean': total / len(values) if values else 0,
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': values[-1] if values else 0
+    }
+
+
+class ProfileReport:
+    def __init__(self):
+        self.books = {}
+        self.stages = {}
+
+    # Add the page timings of a finished book and its wall time
+    def add_book(self, book, pages, wall):
+        stages = {}
+        for page in pages:
+            for name, elapsed in page.get('timings', {}).items():
+                stages.setdefault(name, []).append(elapsed)
+                self.stages.setdefault(name, []).append(elapsed)
+        self.books[str(book)] = {
+            'pages': len(pages),
+            'wall': wall,
+            'pages_per_sec': len(pages) / wall if wall else 0,
+            'stages': {name: summarize(values) for name, values in stages.items()}
+        }
+
+    # Add a book-level stage such as store_write
+    def add_stage(self, book, name, elapsed):
+        self.stages.setdefault(name, []).append(elapsed)
+        self.books[str(book)]['stages'][name] = summarize([elapsed])
+
+    # Write the JSON summary
+    def write(self, path, wall):
+        pages = sum(book['pages'] for book in self.books.values())
+        order = {name: i for i, name in enumerate(STAGES)}
+        summary = {
+            'pages': pages,
+            'wall': wall,
+            'pages_per_sec': pages / wall if wall else 0,
+            'stages': {name: summarize(self.stages[name]) for name in sorted(self.stages, key=lambda name: order.get(name, len(order)))},
+            'books': self.books
+        }
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+# Merge the per-process cProfile dumps '<path>.<pid>' into a single file at path
+def merge_profile_dumps(path):
+    parts = glob.glob(glob.escape(path) + '.*')
+    parts = [part for part in parts if part[len(path) + 1:].isdigit()]
+    if not parts:
+        return False
+    stats = pstats.Stats(*parts)
+    stats.dump_stats(path)
+    for part in parts:
+        os.remove(part)
+    return True
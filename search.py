@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Looks up terms in the term table written by the index build
+#                   (courses/CODE/terms.table), or ranks pages by their text with the
+#                   full-text indexes written by the extraction ({book}.fts and .pages),
+#                   without building anything. Only the standard library is imported, so a
+#                   lookup starts in milliseconds.
+#
+# BASIC USAGE:      # Pages of a term
+#                   sans_search SEC504 netcat
+#
+#                   # Terms starting with, or containing, the query
+#                   sans_search SEC504 --prefix net
+#                   sans_search SEC504 --substring cat
+#
+#                   # Pages ranked by their text, with phrases in quotes
+#                   sans_search SEC504 --text '"reverse shell" listener'
+#
+#                   # Without a query, read queries from standard input (prefix them with
+#                   # '^' for a prefix, '~' for a substring lookup or '?' for a text search)
+#                   sans_search SEC504
+#
+# ---------------------------------------------------------------------------------------------
+
+import os
+import re
+import sys
+import argparse
+from itertools import groupby, islice
+from term_table import TermTable
+from fulltext import FullTextIndex, PageStore, rank, parse_query, snippet
+
+APP_HOME = os.path.dirname(os.path.realpath(__file__))
+FULLTEXT_PATTERN = re.compile(r'(\d+)\.fts')
+
+
+# Directory of a course: a directory or a file in it, or the course under courses/ in the
+# current directory or the app home
+def find_course(course):
+    if os.path.isdir(course):
+        return course
+    if os.path.isfile(course):
+        return os.path.dirname(course) or '.'
+    for home in (os.getcwd(), APP_HOME):
+        path = os.path.join(home, 'courses', course)
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+class Course:
+    # The indexes of a course directory, opened when first needed
+    def __init__(self, path):
+        self.path = path
+        self.table = None
+        self.books = None
+
+    def get_table(self):
+        if self.table is None:
+            self.table = TermTable(os.path.join(self.path, 'terms.table'))
+        return self.table
+
+    # (book, positional index, page store) of every book with a full-text index
+    def get_books(self):
+        if self.books is None:
+            self.books = []
+            for name in sorted(os.listdir(self.path), key=lambda name: (len(name), name)):
+                match = FULLTEXT_PATTERN.fullmatch(name)
+                pages_path = os.path.join(self.path, f'{match.group(1)}.pages') if match else None
+                if match and os.path.exists(pages_path):
+                    self.books.append((int(match.group(1)), FullTextIndex(os.path.join(self.path, name)), PageStore(pages_path)))
+        return self.books
+
+    def close(self):
+        if self.table is not None:
+            self.table.close()
+        for _, index, store in self.books or []:
+            index.close()
+            store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Pages of a term as 'book:page, page, ...' per book
+def format_pages(pages):
+    return '; '.join(f"{book}:{', '.join(page for _, page in book_pages)}" for book, book_pages in groupby(pages, key=lambda page: page[0]))
+
+
+# Print the matching terms with their pages; returns the number of matches
+def search_terms(table, query, mode='exact', limit=50):
+    if mode == 'substring':
+        positions = table.substring(query)
+    else:
+        positions = table.lookup(query, prefix=mode == 'prefix')
+    for position in islice(positions, limit):
+        print(f'{table.term(position)}  {format_pages(table.pages(position))}')
+    if len(positions) > limit:
+        print(f'... {len(positions) - limit} more')
+    return len(positions)
+
+
+# Print the pages best matching a full-text query; returns the number of pages printed
+def search_text(books, query, limit=20):
+    stores = {book: store for book, _, store in books}
+    words = [word for clause in parse_query(query) for word in clause]
+    hits = rank([(book, index) for book, index, _ in books], query, limit)
+    for score, book, page in hits:
+        number, title, text = stores[book].page(page)
+        print(f'{score:7.2f}  {book}:{number}  {title}')
+        line = snippet(text, words)
+        if line:
+            print(f'         {line}')
+    return len(hits)
+
+
+# Run a query: 'exact', 'prefix' and 'substring' look up terms, 'text' searches the page text
+def search(course, query, mode='exact', limit=50):
+    try:
+        if mode == 'text':
+            books = course.get_books()
+            if not books:
+                print(f"[ERROR] No full-text index in {course.path}. Extract the books first.")
+                return 0
+            return search_text(books, query, limit)
+        return search_terms(course.get_table(), query, mode, limit)
+    except FileNotFoundError:
+        print(f"[ERROR] No term table in {course.path}. Build the index first.")
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+    return 0
+
+
+# Queries from standard input, one per line
+def interactive(course, limit):
+    for line in sys.stdin:
+        query = line.strip()
+        if not query:
+            continue
+        mode = {'^': 'prefix', '~': 'substring', '?': 'text'}.get(query[0], 'exact')
+        if mode != 'exact':
+            query = query[1:]
+        if not search(course, query, mode, limit):
+            print(f'No match for {query!r}')
+        sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('course', help='Course code (or path to the course directory)')
+    parser.add_argument('query', nargs='?', help='Term to look up; read from standard input when omitted')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--prefix', action='store_true', help='Match the terms starting with the query')
+    group.add_argument('--substring', action='store_true', help='Match the terms containing the query')
+    group.add_argument('--text', action='store_true', help='Rank the pages whose text matches the query (BM25, "quoted phrases")')
+    parser.add_argument('-n', '--limit', type=int, help='Maximum number of terms or pages to print', default=50)
+    args = parser.parse_intermixed_args()
+
+    path = find_course(args.course)
+    if path is None:
+        print(f"[ERROR] Course {args.course} does not exist")
+        sys.exit(1)
+
+    with Course(path) as course:
+        if args.query is None:
+            interactive(course, args.limit)
+            return
+        mode = 'prefix' if args.prefix else 'substring' if args.substring else 'text' if args.text else 'exact'
+        if not search(course, args.query, mode, args.limit):
+            print(f'No match for {args.query!r}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
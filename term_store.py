@@ -0,0 +1,125 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Compact binary term store for the pages of one book, written by the
+#                   extraction step in place of the intermediate CSV. Every string (term, page
+#                   number, title) is stored once in an interned string table and each page
+#                   holds an array of term ids, so a book is loaded with mmap and a term is
+#                   decoded once no matter how many pages it appears on.
+#
+#                   Layout (little or native endian, see byteorder in the header):
+#                     header    magic, version, byteorder, string/page/posting counts
+#                     offsets   uint32[strings + 1]   byte offsets into the string blob
+#                     pages     uint32[pages * 3]     page number id, title id, first posting
+#                     postings  uint32[postings]      term ids of each page, in page order
+#                     blob      UTF-8 strings
+#
+# ---------------------------------------------------------------------------------------------
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b'SANSTERM'
+STORE_VERSION = 1
+HEADER = struct.Struct('<8sIIIII')
+BYTEORDERS = {'little': 0, 'big': 1}
+
+
+# Write the pages of a book (page, title, words) to a term store. Words are de-duplicated
+# per page in order, like the rows of the CSV export.
+def write_term_store(path, pages):
+    ids = {}
+    blob = bytearray()
+    offsets = array('I', [0])
+    page_table = array('I')
+    postings = array('I')
+
+    def intern(string):
+        if string not in ids:
+            ids[string] = len(ids)
+            blob.extend(string.encode('utf-8'))
+            offsets.append(len(blob))
+        return ids[string]
+
+    for page in pages:
+        page_table.extend((intern(str(page['page'])), intern(page['title'] or ''), len(postings)))
+        postings.extend(intern(word) for word in dict.fromkeys(page['words']))
+
+    # Written to a temporary file first so that a failed write never leaves a truncated store
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, STORE_VERSION, BYTEORDERS[sys.byteorder], len(ids), len(page_table) // 3, len(postings)))
+        offsets.tofile(f)
+        page_table.tofile(f)
+        postings.tofile(f)
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class TermStore:
+    # Open a term store; its arrays are views on the memory-mapped file
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f'{path} is not a term store')
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byteorder, self.string_count, self.page_count, self.posting_count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a term store')
+        if version != STORE_VERSION:
+            raise ValueError(f'{path} has term store version {version}, expected {STORE_VERSION}')
+        self.view = memoryview(self.map)
+        start = HEADER.size
+        self.offsets, start = self.section(start, self.string_count + 1, byteorder)
+        self.pages, start = self.section(start, self.page_count * 3, byteorder)
+        self.postings, start = self.section(start, self.posting_count, byteorder)
+        self.blob = self.view[start:]
+        self.strings = [None] * self.string_count
+
+    # A uint32 array of count items at start; copied and swapped only when the byte order differs
+    def section(self, start, count, byteorder):
+        end = start + count * 4
+        if end > len(self.view):
+            raise ValueError(f'{self.path} is truncated')
+        if byteorder == BYTEORDERS[sys.byteorder]:
+            return self.view[start:end].cast('I'), end
+        values = array('I', self.view[start:end])
+        values.byteswap()
+        return values, end
+
+    # Decode a string by id; each string is decoded once
+    def string(self, string_id):
+        string = self.strings[string_id]
+        if string is None:
+            string = str(self.blob[self.offsets[string_id]:self.offsets[string_id + 1]], 'utf-8')
+            self.strings[string_id] = string
+        return string
+
+    # Page number, title and term ids of the page at index
+    def page(self, index):
+        label, title, first = self.pages[index * 3:index * 3 + 3]
+        last = self.pages[index * 3 + 5] if index + 1 < self.page_count else self.posting_count
+        return self.string(label), self.string(title), self.postings[first:last]
+
+    # Rows in the CSV layout (page, title, *words); words are shared decoded strings
+    def rows(self):
+        for index in range(self.page_count):
+            label, title, term_ids = self.page(index)
+            yield [label, title, *map(self.string, term_ids)]
+
+    def close(self):
+        for values in (self.offsets, self.pages, self.postings, self.blob):
+            if isinstance(values, memoryview):
+                values.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
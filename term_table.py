@@ -0,0 +1,125 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Sorted term table of a course index for lookups, written next to main.idx
+#                   by the index build (InvertedIndex.write_term_table) and memory-mapped by
+#                   search.py. Terms are sorted by their UTF-8 bytes, so exact and prefix
+#                   lookups are binary searches; a sorted table of all term suffixes does the
+#                   same for substring lookups. Reading a table only needs the standard library.
+#
+#                   Layout (native byte order, see byteorder in the header):
+#                     header            magic, version, byteorder, term/page/posting/suffix counts
+#                     term offsets      uint32[terms + 1]   offsets into the term blob
+#                     posting offsets   uint32[terms + 1]   first posting of each term
+#                     postings          uint32[postings]    page ids
+#                     page books        uint32[pages]       book of each page
+#                     page offsets      uint32[pages + 1]   offsets into the page blob
+#                     suffixes          uint32[suffixes]    term blob offsets, sorted by suffix
+#                     term blob         NUL-terminated UTF-8 terms, sorted
+#                     page blob         UTF-8 page numbers
+#
+# ---------------------------------------------------------------------------------------------
+
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+
+MAGIC = b'SANSTABL'
+TABLE_VERSION = 1
+HEADER = struct.Struct('<8sIIIIII')
+BYTEORDERS = {'little': 0, 'big': 1}
+
+
+# Sequence of the keys of a sorted section, for bisect
+class SortedKeys:
+    def __init__(self, count, key):
+        self.count = count
+        self.key = key
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        return self.key(position)
+
+
+class TermTable:
+    # Open a term table; its arrays are views on the memory-mapped file
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError(f'{path} is not a term table')
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byteorder, self.term_count, self.page_count, posting_count, suffix_count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a term table')
+        if version != TABLE_VERSION:
+            raise ValueError(f'{path} has term table version {version}, expected {TABLE_VERSION}')
+        if byteorder != BYTEORDERS[sys.byteorder]:
+            raise ValueError(f'{path} was written on a machine with a different byte order')
+        self.view = memoryview(self.map)
+        start = HEADER.size
+        self.term_offsets, start = self.section(start, self.term_count + 1)
+        self.posting_offsets, start = self.section(start, self.term_count + 1)
+        self.postings, start = self.section(start, posting_count)
+        self.page_books, start = self.section(start, self.page_count)
+        self.page_offsets, start = self.section(start, self.page_count + 1)
+        self.suffixes, start = self.section(start, suffix_count)
+        self.term_blob = self.view[start:start + self.term_offsets[-1]]
+        self.page_blob = self.view[start + self.term_offsets[-1]:]
+
+    # A uint32 array of count items at start
+    def section(self, start, count):
+        end = start + count * 4
+        if end > len(self.view):
+            raise ValueError(f'{self.path} is truncated')
+        return self.view[start:end].cast('I'), end
+
+    # UTF-8 bytes of a term by position in the sorted table
+    def term_bytes(self, position):
+        return bytes(self.term_blob[self.term_offsets[position]:self.term_offsets[position + 1] - 1])
+
+    def term(self, position):
+        return self.term_bytes(position).decode('utf-8')
+
+    # (book, page) of every page a term occurs on
+    def pages(self, position):
+        pages = []
+        for page in self.postings[self.posting_offsets[position]:self.posting_offsets[position + 1]]:
+            number = bytes(self.page_blob[self.page_offsets[page]:self.page_offsets[page + 1]]).decode('utf-8')
+            pages.append((self.page_books[page], number))
+        return pages
+
+    # Positions of the terms equal to the query, or starting with it. Terms are indexed in
+    # lowercase, so the query is lowercased the same way.
+    def lookup(self, query, prefix=False):
+        query = query.lower().encode('utf-8')
+        if prefix:
+            keys = SortedKeys(self.term_count, lambda position: self.term_bytes(position)[:len(query)])
+        else:
+            keys = SortedKeys(self.term_count, self.term_bytes)
+        return range(bisect_left(keys, query), bisect_right(keys, query))
+
+    # Positions of the terms containing the query, in table order
+    def substring(self, query):
+        query = query.lower().encode('utf-8')
+        keys = SortedKeys(len(self.suffixes), lambda position: bytes(self.term_blob[self.suffixes[position]:self.suffixes[position] + len(query)]))
+        low = bisect_left(keys, query)
+        high = bisect_right(keys, query, low)
+        # The term of a suffix is the last one starting at or before its offset
+        return sorted({bisect_right(self.term_offsets, self.suffixes[position]) - 1 for position in range(low, high)})
+
+    def close(self):
+        for values in (self.term_offsets, self.posting_offsets, self.postings, self.page_books, self.page_offsets, self.suffixes,
+                       self.term_blob, self.page_blob):
+            values.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,87 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Agreement of the contour and projection title bar detectors. Both run on
+#                   the synthetic books of benchmark.py and on bars just inside and just
+#                   outside the position and size limits of the title box.
+#
+# BASIC USAGE:      python3 -m pytest -q test_box_detectors.py
+#
+# ---------------------------------------------------------------------------------------------
+
+import random
+import fitz
+import pytest
+from benchmark import load_indexer, make_book, make_vocabulary, compare_box_detectors
+
+# top_bounds of the benchmark processors, as [y0, y1, x0, x1] at 300 DPI
+TOP_BOUNDS = [320, 550, 250, 2300]
+# Bars as (x, y, width, height) in pixels from the top_bounds origin. The detected box is the
+# bar grown by 2 pixels on every side, so it passes x < 200, width > 500 and height > 50 for
+# x < 202, width > 496 and height > 46.
+LIMIT_BARS = [
+    ((150, 40, 700, 100), True),
+    ((199, 40, 700, 100), True),
+    ((201, 40, 700, 100), True),
+    ((202, 40, 700, 100), False),
+    ((204, 40, 700, 100), False),
+    ((100, 40, 497, 100), True),
+    ((100, 40, 496, 100), False),
+    ((100, 40, 494, 100), False),
+    ((100, 40, 700, 47), True),
+    ((100, 40, 700, 46), False),
+    ((100, 40, 700, 44), False),
+    ((100, 0, 1500, 60), True),
+]
+
+
+@pytest.fixture(scope='module')
+def indexer():
+    return load_indexer()
+
+
+# A page per limit bar, each a dark bar on a white page
+def make_limit_book(path, bars):
+    doc = fitz.open()
+    scale = 72 / 300
+    for (x, y, w, h), _ in bars:
+        page = doc.new_page(width=792, height=612)
+        left, top = TOP_BOUNDS[2] + x, TOP_BOUNDS[0] + y
+        page.draw_rect(fitz.Rect(left, top, left + w, top + h) * scale, color=None, fill=(0.1, 0.1, 0.2))
+    doc.save(path)
+    doc.close()
+
+
+def test_agree_on_synthetic_books(indexer, tmp_path):
+    rng = random.Random(1)
+    vocabulary = make_vocabulary(500, rng)
+    paths = []
+    for book_num in (1, 2):
+        path = str(tmp_path / f'book{book_num}.pdf')
+        make_book(path, book_num, 12, vocabulary, rng)
+        paths.append(path)
+    _, _, disagreements = compare_box_detectors(indexer, paths)
+    assert disagreements == []
+
+
+def test_agree_at_limits(indexer, tmp_path):
+    path = str(tmp_path / 'limits.pdf')
+    make_limit_book(path, LIMIT_BARS)
+    _, _, disagreements = compare_box_detectors(indexer, [path])
+    assert disagreements == []
+
+
+@pytest.mark.parametrize('detector', ['contour', 'projection'])
+def test_title_box_limits(indexer, tmp_path, detector):
+    path = str(tmp_path / 'limits.pdf')
+    make_limit_book(path, LIMIT_BARS)
+    processor = indexer.PDFProcessor(top_bounds=TOP_BOUNDS, ocr_dpi=300, stopwords=[], box_detector=detector)
+    with fitz.open(path) as doc:
+        for page, ((x, y, w, h), found) in zip(doc, LIMIT_BARS):
+            # Keep the pixmap referenced while its samples are in use
+            pixmap = processor.get_region_pixmap(page, TOP_BOUNDS)
+            box = processor.find_title_box(indexer.pixmap_to_array(pixmap), TOP_BOUNDS)
+            if not found:
+                assert box is None, (x, y, w, h)
+                continue
+            top, left = TOP_BOUNDS[0] + y, TOP_BOUNDS[2] + x
+            assert box == [max(TOP_BOUNDS[0], top - 2), top + h + 2, left - 2, left + w + 2], (x, y, w, h)
@@ -0,0 +1,64 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Terms of the index of all books. Every page a term is on is recorded, so
+#                   the frequency limit (-f) drops terms found on that many pages or more.
+#                   The nested dictionary index before the inverted index kept only the first
+#                   page of every term, so main.idx listed one page per term and -f dropped
+#                   nothing; these tests pin the corrected behaviour.
+#
+# BASIC USAGE:      python3 -m pytest -q test_inverted_index.py
+#
+# ---------------------------------------------------------------------------------------------
+
+import random
+import pytest
+from benchmark import load_indexer
+
+
+@pytest.fixture(scope='module')
+def indexer():
+    return load_indexer()
+
+
+# Index rows (page, title, *words) of books into one index and filter it at max_count pages
+def build(indexer, books, max_count=10):
+    creator = indexer.IndexCreator('TEST', 'index.pdf', max_count)
+    word_dictionary = None
+    for book, rows in enumerate(books, 1):
+        word_dictionary = creator.build_word_dictionary(book, rows, word_dictionary)
+    selection = creator.filter_word_dictionary(word_dictionary, min_count=1, max_count=max_count)
+    return sorted(selection.entries())
+
+
+# The pages of every term as a dictionary would collect them, filtered the same way
+def expected_entries(books, max_count=10):
+    pages = {}
+    for book, rows in enumerate(books, 1):
+        for row in rows:
+            for w in row[2:]:
+                if w != row[0]:
+                    pages.setdefault(w, {}).setdefault((book, row[0]), 1)
+    return sorted((w, book, page) for w, found in pages.items() if len(found) < max_count and ' ' not in w
+                  for book, page in found)
+
+
+def test_records_every_page(indexer):
+    books = [[['1', 'Intro', 'kadath', 'onyx'], ['2', '', 'kadath'], ['3', '', 'onyx', 'kadath']],
+             [['1', 'Dreams', 'kadath']]]
+    entries = build(indexer, books)
+    assert [entry for entry in entries if entry[0] == 'kadath'] == [('kadath', 1, '1'), ('kadath', 1, '2'), ('kadath', 1, '3'), ('kadath', 2, '1')]
+    assert [entry for entry in entries if entry[0] == 'onyx'] == [('onyx', 1, '1'), ('onyx', 1, '3')]
+
+
+def test_freq_limit_drops_terms(indexer):
+    rows = [[str(page), '', 'common'] + (['rare'] if page < 9 else []) for page in range(1, 11)]
+    terms = {entry[0] for entry in build(indexer, [rows], max_count=10)}
+    assert terms == {'rare'}
+
+
+def test_matches_dictionary(indexer):
+    rng = random.Random(3)
+    vocabulary = [f'term{n}' for n in range(60)] + ['two words']
+    books = [[[str(page), ''] + rng.sample(vocabulary, rng.randint(0, 12)) for page in range(1, rng.randint(5, 30))]
+             for _ in range(3)]
+    assert build(indexer, books, max_count=8) == expected_entries(books, max_count=8)
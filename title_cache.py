@@ -0,0 +1,61 @@
+# ---------------------------------------------------------------------------------------------
+#
+# DESCRIPTION:      Persistent, content-addressed cache of OCR'd page titles. Entries are
+#                   keyed by a hash of the cropped, inverted title image and the OCR engine, so repeated title
+#                   bars and re-runs over unchanged books skip Tesseract. The cache is an
+#                   SQLite file bounded to max_entries with least-recently-used eviction;
+#                   it can be shared by several worker processes.
+#
+# ---------------------------------------------------------------------------------------------
+
+import hashlib
+import sqlite3
+import time
+
+
+class TitleCache:
+    # Open (or create) the cache file
+    def __init__(self, path, max_entries=50000):
+        self.path = path
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS titles (key TEXT PRIMARY KEY, text TEXT NOT NULL, used INTEGER NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS titles_used ON titles (used)')
+        self.size = self.db.execute('SELECT COUNT(*) FROM titles').fetchone()[0]
+
+    # Hash a title image (shape and pixels) together with the OCR engine (backend and
+    # Tesseract version, see the backends' identity) and language
+    @staticmethod
+    def image_key(img, engine, lang='eng'):
+        digest = hashlib.sha1()
+        digest.update(f'{engine}:{lang}:{img.shape}:{img.dtype}'.encode())
+        digest.update(img.tobytes())
+        return digest.hexdigest()
+
+    # Return the cached OCR text for a key, or None
+    def get(self, key):
+        row = self.db.execute('SELECT text FROM titles WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute('UPDATE titles SET used = ? WHERE key = ?', (time.time_ns(), key))
+        return row[0]
+
+    # Store the OCR text for a key, evicting the least recently used entries when full
+    def put(self, key, text):
+        cursor = self.db.execute('INSERT OR REPLACE INTO titles (key, text, used) VALUES (?, ?, ?)', (key, text, time.time_ns()))
+        self.size += cursor.rowcount
+        if self.size > self.max_entries:
+            self.evict()
+
+    # Trim the cache down to max_entries
+    def evict(self):
+        self.size = self.db.execute('SELECT COUNT(*) FROM titles').fetchone()[0]
+        excess = self.size - self.max_entries
+        if excess > 0:
+            self.db.execute('DELETE FROM titles WHERE key IN (SELECT key FROM titles ORDER BY used LIMIT ?)', (excess,))
+            self.size -= excess
+
+    def close(self):
+        self.db.close()